@@ -1,21 +1,47 @@
-from deca.ff_rtpc import rtpc_from_binary, RtpcNode
-from typing import List, Optional, Tuple
+from deca.ff_rtpc import rtpc_from_binary, rtpc_events_from_binary, rtpc_node_fingerprint, RtpcNode, h_prop_class, h_prop_name, k_event_enter_node, k_event_prop
+from deca.ff_rtpc_index import RtpcClassIndex
+from deca.ff_rtpc_schema import RtpcSchema
+from typing import Dict, List, Optional, Tuple
 from datetime import date
 from pathlib import Path
 from enum import Enum
 import numpy as np
 import re
+import sys
 import json
 
 animal_levels = json.load(Path("animal_levels.json").open())
 animal_diamonds = json.load(Path("animal_diamonds.json").open())
 
+ANIMAL_SCHEMA = RtpcSchema("CAnimalType", {
+  "name": "name"
+})
+SCORE_DISTRIBUTION_SCHEMA = RtpcSchema("SAnimalTypeScoringDistributionSettings", {
+  "score_type": "name",
+  "low_score": "score_min",
+  "high_score": "score_max",
+  "low_weight": "weight_min",
+  "high_weight": "weight_max"
+})
+VISUAL_VARIATION_SCHEMA = RtpcSchema("SAnimalTypeVisualVariation", {
+  "gender": "gender",
+  "index": "index",
+  "rarity": "type_rarity",
+  "prob": "probability",
+  "name": "type_name"
+})
+
 class Animal:
-  def __init__(self, name: str, data: RtpcNode) -> None:
+  __slots__ = ("name", "data", "index")
+
+  def __init__(self, name: str, data: RtpcNode, index: Optional[RtpcClassIndex] = None) -> None:
     self.name = name
     self.data = data
+    self.index = index if index is not None else RtpcClassIndex(data)
 
 class FurVariation:
+  __slots__ = ("animal_name", "index", "type", "gender", "rarity", "prob")
+
   def __init__(self, animal_name: str, index: str, type: str, gender: str, rarity: str, prob: float) -> None:
     self.animal_name = animal_name
     self.index = index
@@ -25,11 +51,15 @@ class FurVariation:
     self.prob = prob
 
 class FurVariationGroup:
+  __slots__ = ("animal_name", "furs")
+
   def __init__(self, animal_name: str, furs: List[FurVariation]) -> None:
     self.animal_name = animal_name
     self.furs = furs
 
 class AnimalScores:
+  __slots__ = ("animal_name", "gender", "low_score", "high_score", "low_weight", "high_weight", "data_offset")
+
   def __init__(self, animal_name: str, gender: str, low_score: float, high_score: float, low_weight: float, high_weight: float, data_offset = None) -> None:
     self.animal_name = animal_name
     self.gender = gender
@@ -54,6 +84,8 @@ class AnimalGroupScores:
   level_3_quantile = [0,.57,.95,1]
   level_5_quantile = [0, 0.3, 0.6, 0.8, 0.92, 1]
   level_9_quantile = [0,0.24,0.39,0.58,0.65,0.69,0.74,0.83,.9,1]
+  level_quantiles = {3: level_3_quantile, 5: level_5_quantile, 9: level_9_quantile}
+  __slots__ = ("animal_name", "gendered_scores", "level", "diamond_low_score", "diamond_high_score", "diamond_low_weight", "diamond_high_weight", "level_values")
   
   def __init__(self, animal_name: str, gendered_scores: List[AnimalScores]) -> None:
     self.animal_name = animal_name
@@ -80,27 +112,62 @@ class AnimalGroupScores:
   def _highest_weight(self) -> float:
     return max([x.high_weight for x in self.gendered_scores])
   
-  def update_levels(self) -> None:
-    lowest_weight = self._lowest_weight()
-    highest_weight = self._highest_weight()
-    self.diamond_high_score = round(self._highest_score(), 3)
-    self.diamond_high_weight = round(highest_weight, 3)
-    lowest_weight = round(lowest_weight * 100)
-    highest_weight = round(highest_weight * 100)    
-    if self.level == 5:
-      q = self.level_5_quantile      
-    elif self.level == 9:
-      q = self.level_9_quantile
-    else:
-      q = self.level_3_quantile
-    cuts = np.quantile(list(range(lowest_weight, highest_weight)), q=q)
-    self.diamond_low_weight = round(cuts[-2] / 100, 3)
-    level_values = []
-    for i in range(len(cuts) - 1):
-      level_values.append((round(cuts[i] / 100, 3), round(cuts[i+1] / 100, 3)))
-    self.level_values = level_values
-    
-    
+  def update_levels(self, quantiles: Optional[Dict[int, List[float]]] = None) -> None:
+    _update_levels([self], quantiles)
+
+def _range_quantiles(low: np.ndarray, high: np.ndarray, q: np.ndarray) -> np.ndarray:
+  """
+  np.quantile(range(low, high), q) for every row of low/high (integer column vectors), without building the ranges.
+  Sorted consecutive integers interpolate to low + (n - 1) * q; the arithmetic follows np.quantile's "linear" method
+  step by step so the results are bit for bit the same. Like np.quantile of an empty range, a row with high <= low
+  is an error.
+  """
+  n = high - low
+  if (n <= 0).any():
+    raise ValueError("empty range, high must be greater than low")
+  virtual = (n - 1) * q
+  previous = np.floor(virtual)
+  gamma = virtual - previous
+  last = (n - 1).astype(np.float64)
+  previous = np.minimum(np.maximum(previous, 0), last)
+  a = low + previous
+  b = low + np.minimum(previous + 1, last)
+  diff = b - a
+  return np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+
+def _update_levels(groups: List[AnimalGroupScores], quantiles: Optional[Dict[int, List[float]]] = None) -> None:
+  """
+  AnimalGroupScores.update_levels for many groups at once. quantiles maps a level to its quantile cut points, on top
+  of AnimalGroupScores.level_quantiles; levels found in neither use level_3_quantile. Groups sharing a set of cut
+  points are computed together as one 2-D array.
+  """
+  level_quantiles = dict(AnimalGroupScores.level_quantiles)
+  if quantiles:
+    level_quantiles.update(quantiles)
+  
+  by_quantiles = {}
+  for group in groups:
+    highest_weight = group._highest_weight()
+    group.diamond_high_score = round(group._highest_score(), 3)
+    group.diamond_high_weight = round(highest_weight, 3)
+    q = tuple(level_quantiles.get(group.level, AnimalGroupScores.level_3_quantile))
+    by_quantiles.setdefault(q, []).append((group, round(group._lowest_weight() * 100), round(highest_weight * 100)))
+
+  for q, items in by_quantiles.items():
+    low = np.array([x[1] for x in items], dtype=np.int64)[:, None]
+    high = np.array([x[2] for x in items], dtype=np.int64)[:, None]
+    empty = np.flatnonzero(high[:, 0] <= low[:, 0])
+    if len(empty):
+      names = ", ".join(items[i][0].animal_name for i in empty.tolist())
+      raise ValueError(f"no weight range to compute levels from for {names}")
+    cuts = np.round(_range_quantiles(low, high, np.array(q, dtype=np.float64)[None, :]) / 100, 3)
+    for (group, _, _), row in zip(items, cuts):
+      # numpy scalars, as np.quantile gave, so later rounding for display is unchanged
+      row = list(row)
+      group.diamond_low_weight = row[-2]
+      group.level_values = list(zip(row[:-1], row[1:]))
+
+
 def _group_scores(scores: List[AnimalScores]) -> List[AnimalGroupScores]:
   groups = {}
   for score in scores:
@@ -110,13 +177,11 @@ def _group_scores(scores: List[AnimalScores]) -> List[AnimalGroupScores]:
     else:
       groups[score.animal_name] = AnimalGroupScores(score.animal_name, [score])
   groups = list(groups.values())
-  for group in groups:
-    group.update_levels()
+  _update_levels(groups)
   return groups
 
-def _open_rtpc(filename: str) -> RtpcNode:
-  with open(filename, 'rb') as f:
-    data = rtpc_from_binary(f) 
+def _open_rtpc(filename: str, lazy: bool = True) -> RtpcNode:
+  data = rtpc_from_binary(filename, lazy=lazy)
   root = data.root_node
   return root.child_table[0]  
 
@@ -241,213 +306,380 @@ def _create_all_animal_details(group_scores: List[AnimalGroupScores]) -> dict:
     animal_details[group_score.animal_name] = _create_animal_details(group_score)
   return animal_details
 
-def _find_child_node(tables: List[RtpcNode], class_name: str, index: int = 0) -> Optional[RtpcNode]:
-  for child in tables:
-    class_value = child.prop_table[index].data
-    if isinstance(class_value, bytes):
-      table_class = child.prop_table[index].data.decode("utf-8")
-    else:
-      continue
-    if table_class == class_name:
-      return child
-  return None
-
-def _find_child_nodes(tables: List[RtpcNode], class_name: str, index: int = 0) -> List[RtpcNode]:
-  classes = []
-  for child in tables:
-    class_value = child.prop_table[index].data
-    if isinstance(class_value, bytes):
-      table_class = child.prop_table[index].data.decode("utf-8")
-    else:
-      continue
-    if table_class == class_name:
-      classes.append(child)   
-  return classes
+def _find_child_node(index: RtpcClassIndex, parent: RtpcNode, class_name: str) -> Optional[RtpcNode]:
+  return index.child(parent, class_name)
+
+def _find_child_nodes(index: RtpcClassIndex, parent: RtpcNode, class_name: str) -> List[RtpcNode]:
+  return index.children(parent, class_name)
 
 def _get_animals(animal_list: RtpcNode, debug = False) -> List[Animal]:
+  index = RtpcClassIndex(animal_list)
   animals = []
   for animal in animal_list.child_table:
-    LARGE_ANIMAL = 87
-    MEDIUM_ANIMAL = 86
-    SHORT_ANIMAL = 84
-    if animal.prop_count == MEDIUM_ANIMAL:
-      animal_name_index = 75
-    elif animal.prop_count == LARGE_ANIMAL and isinstance(animal.prop_table[76].data, bytes):
-      animal_name_index = 76
-    elif animal.prop_count == LARGE_ANIMAL and isinstance(animal.prop_table[75].data, bytes):
-      animal_name_index = 75
-    elif animal.prop_count == SHORT_ANIMAL:
-      animal_name_index = 73
-    else:
+    animal_name = ANIMAL_SCHEMA.read(animal).name
+    if not isinstance(animal_name, bytes):
       if debug:
-        print("skipping animal with unknown format", animal.prop_count, animal.data_offset, animal.prop_table[76].data)
+        print("skipping animal with unknown format", animal.prop_count, animal.data_offset)
       continue
-    
-    animal_name = animal.prop_table[animal_name_index].data.decode("utf-8")
+
+    # interned, so every record of the animal, across all loaded files, shares one string
+    animal_name = sys.intern(animal_name.decode("utf-8"))
     if animal_name == "unknown" or animal_name == "homo_sapien":
       continue
-    animals.append(Animal(animal_name, animal))
+    animals.append(Animal(animal_name, animal, index))
   return animals
 
+MALE_TYPE = re.compile(r"^male_", re.RegexFlag.I)
+FEMALE_TYPE = re.compile(r"^female_", re.RegexFlag.I)
+GO_TYPE = re.compile(r".*greatone.*", re.RegexFlag.I)
+
+def _score_gender(score_type: bytes, debug = False) -> Optional[str]:
+  # gender of a scoring distribution from its name, None for Great Ones (and unknown names when debugging)
+  gender = score_type.decode("utf-8")
+  if GO_TYPE.match(gender):
+    return None
+  elif MALE_TYPE.match(gender):
+    return "male"
+  elif FEMALE_TYPE.match(gender):
+    return "female"
+  if debug:
+    print(f"{gender} is an unknown score type")
+    return None
+  return gender
+
 def _process_scores(animals: List[Animal], only_animal: str = None, debug = False) -> list:
   animal_scores = []
   for animal in animals:
     if only_animal and animal.name != only_animal:
       continue
     
-    score_settings = _find_child_node(animal.data.child_table, "CAnimalTypeScoringSettings")
+    score_settings = _find_child_node(animal.index, animal.data, "CAnimalTypeScoringSettings")
     if not score_settings:
       if debug:
         print("%5sno score settings found for %10s" % ("", animal.name))
       continue
 
-    distribution_settings = _find_child_nodes(score_settings.child_table, "SAnimalTypeScoringDistributionSettings", index=1)
-    LOW_SCORE_INDEX = 0
-    HIGH_SCORE_INDEX = 11
-    SCORE_TYPE_INDEX = 9
-    LOW_WEIGHT_INDEX = 5
-    HIGH_WEIGHT_INDEX = 2
-    MALE_TYPE = re.compile(r"^male_", re.RegexFlag.I)
-    FEMALE_TYPE = re.compile(r"^female_", re.RegexFlag.I)
-    GO_TYPE = re.compile(r".*greatone.*", re.RegexFlag.I)
+    distribution_settings = _find_child_nodes(animal.index, score_settings, "SAnimalTypeScoringDistributionSettings")
 
     for distribution_setting in distribution_settings:
-      gender = distribution_setting.prop_table[SCORE_TYPE_INDEX].data.decode("utf-8")
-      if GO_TYPE.match(gender):
+      fields = SCORE_DISTRIBUTION_SCHEMA.read(distribution_setting)
+      gender = _score_gender(fields.score_type, debug)
+      if gender is None:
         continue
-      elif MALE_TYPE.match(gender):
-        gender = "male"
-      elif FEMALE_TYPE.match(gender):
-        gender = "female"
-      else:
-        if debug:
-          print(f"{gender} is an unknown score type")
-          continue
-      low_score = distribution_setting.prop_table[LOW_SCORE_INDEX].data
-      high_score = distribution_setting.prop_table[HIGH_SCORE_INDEX].data
-      low_weight = distribution_setting.prop_table[LOW_WEIGHT_INDEX].data
-      high_weight = distribution_setting.prop_table[HIGH_WEIGHT_INDEX].data
-      scores = AnimalScores(animal.name, gender, low_score, high_score, low_weight, high_weight, distribution_setting.data_offset)
+      scores = AnimalScores(animal.name, gender, fields.low_score, fields.high_score, fields.low_weight, fields.high_weight, distribution_setting.data_offset)
       animal_scores.append(scores)
   return _sort_animals(animal_scores)
 
-def _process_fur_variations(animals: List[Animal], only_animal: str = None, debug = False) -> List[FurVariationGroup]:
+def _stream_scores(filename: str, only_animal: str = None, debug = False) -> List[AnimalScores]:
+  """
+  Same scores as _process_scores(_get_animals(_open_rtpc(filename))), extracted in a single streaming pass over the
+  file without building the tree.
+  """
+  fields = SCORE_DISTRIBUTION_SCHEMA.field_hashes
+
+  animal_scores = []
+  # per open node: [header, {name_hash: value}, children seen, matched]
+  stack = []
+  for event in rtpc_events_from_binary(filename):
+    kind = event[0]
+    if kind == k_event_enter_node:
+      depth = len(stack)
+      if depth > 0:
+        stack[-1][2] += 1
+      stack.append([event[1], {}, 0, False])
+    elif kind == k_event_prop:
+      stack[-1][1][event[1]] = event[3]
+    else:
+      header, props, _, _ = stack.pop()
+      depth = len(stack)
+      if depth == 3 and props.get(h_prop_class) == b"CAnimalTypeScoringSettings":
+        # only the first scoring settings of each animal is used
+        stack[2][3] = True
+      if depth != 4:
+        continue
+      root, _, animal, score_settings = stack
+      if root[2] != 1 or animal[3] or props.get(h_prop_class) != b"SAnimalTypeScoringDistributionSettings":
+        continue
+      if score_settings[1].get(h_prop_class) != b"CAnimalTypeScoringSettings":
+        continue
+      animal_name = animal[1].get(h_prop_name)
+      if not isinstance(animal_name, bytes):
+        continue
+      animal_name = sys.intern(animal_name.decode("utf-8"))
+      if animal_name == "unknown" or animal_name == "homo_sapien":
+        continue
+      if only_animal and animal_name != only_animal:
+        continue
+
+      gender = _score_gender(props[fields["score_type"]], debug)
+      if gender is None:
+        continue
+      animal_scores.append(AnimalScores(
+        animal_name,
+        gender,
+        props[fields["low_score"]],
+        props[fields["high_score"]],
+        props[fields["low_weight"]],
+        props[fields["high_weight"]],
+        header[1]
+      ))
+  return _sort_animals(animal_scores)
+
+k_gender_both = 0
+k_gender_male = 1
+k_gender_female = 2
+GENDER_NAMES = ["both", "male", "female"]
+RARITY_NAMES = ["very common", "common", "rare", "very rare", "uknown"]
+
+class FurTable:
+  """
+  The visual variations of many animals as columns, one row per variation in file order: animal (position in
+  animal_names), index, type (position in type_names), gender (k_gender_*), rarity (position in RARITY_NAMES) and
+  the raw probability. Build it once with _fur_table, _fur_groups then works on the arrays alone.
+  """
+  __slots__ = ("animal_names", "type_names", "animal", "index", "type", "gender", "rarity", "prob")
+
+  def __init__(self, animal_names: List[str], type_names: List[str], animal: np.ndarray, index: np.ndarray, type: np.ndarray, gender: np.ndarray, rarity: np.ndarray, prob: np.ndarray) -> None:
+    self.animal_names = animal_names
+    self.type_names = type_names
+    self.animal = animal
+    self.index = index
+    self.type = type
+    self.gender = gender
+    self.rarity = rarity
+    self.prob = prob
+
+  def __len__(self) -> int:
+    return len(self.animal)
+
+def _fur_table(animals: List[Animal], only_animal: str = None, debug = False) -> FurTable:
   fur_name = re.compile(r"animal_visual_variation_(\w+)$")
 
-  animal_furs = []
+  animal_names = []
+  type_codes = {}
+  rows = []
   for animal in animals:
     if only_animal and animal.name != only_animal:
       continue
 
-    visual_settings = _find_child_node(animal.data.child_table, "CAnimalTypeVisualVariationSettings")
-    
-    gender_index = 0
-    LONG_VARIATION = 15
-    MEDIUM_VARIATION = 14
-    SHORT_VARIATION = 13
-    variation_details = []
-    male_prob_total = 0
-    female_prob_total = 0
-    both_prob_total = 0    
+    animal_id = len(animal_names)
+    animal_names.append(animal.name)
+    visual_settings = _find_child_node(animal.index, animal.data, "CAnimalTypeVisualVariationSettings")
     for variation in visual_settings.child_table:
-      if MEDIUM_VARIATION == variation.prop_count:
-        gender_index = 4
-        index_index = 5
-        rarity_index = 7
-        prob_index = 11
-        name_index = 13
-      elif SHORT_VARIATION == variation.prop_count:
-        gender_index = 3
-        index_index = 4
-        rarity_index = 6
-        prob_index = 10
-        name_index = 12      
-      elif LONG_VARIATION == variation.prop_count:
-        gender_index = 4
-        index_index = 5
-        rarity_index = 7
-        prob_index = 11
-        name_index = 14
-      else:
+      accessor = VISUAL_VARIATION_SCHEMA.accessor(variation)
+      if not accessor.complete:
         if debug:
           print("skipping variation with unknown format", variation.data_offset)
         continue
 
-      gender = _map_gender(variation.prop_table[gender_index].data)
-      index = variation.prop_table[index_index].data
-      rarity = variation.prop_table[rarity_index].data
-      if rarity == 0:
-        rarity = "very common"
-      elif rarity == 1:
-        rarity = "common"        
-      elif rarity == 2:
-        rarity = "rare"
-      elif rarity == 3:
-        rarity = "very rare"
-      else:
-        rarity = "uknown"
-      fur_type = fur_name.match(variation.prop_table[name_index].data.decode("utf-8")).group(1)
-      if "great_one" in fur_type:
+      fields = accessor(variation.prop_table)
+      fur_type = fur_name.match(fields.name.decode("utf-8")).group(1)
+      if "great_one" in fur_type or fields.prob == 0:
         continue
 
-      fur_type = _format_name(fur_type)
+      gender = fields.gender if fields.gender in (k_gender_both, k_gender_male) else k_gender_female
+      rarity = fields.rarity if 0 <= fields.rarity < len(RARITY_NAMES) - 1 else len(RARITY_NAMES) - 1
+      type_code = type_codes.setdefault(sys.intern(_format_name(fur_type)), len(type_codes))
+      rows.append((animal_id, fields.index, type_code, gender, rarity, fields.prob))
+
+  columns = np.array(rows, dtype=np.int64).reshape(-1, 6).T
+  return FurTable(
+    animal_names,
+    list(type_codes),
+    columns[0].astype(np.int32),
+    columns[1],
+    columns[2].astype(np.int32),
+    columns[3].astype(np.int8),
+    columns[4].astype(np.int8),
+    columns[5].astype(np.float64)
+  )
+
+def _fur_groups(table: FurTable) -> List[FurVariationGroup]:
+  """
+  Normalize, merge and sort the furs of every animal in the table at once. Each probability becomes a percentage of
+  the animal's total for its gender (male and female totals include furs for both), furs of the same type are merged
+  into one for both genders keeping the later variation's rarity and probability, and each animal's furs are sorted
+  by probability, highest first.
+  """
+  n_animals = len(table.animal_names)
+  if len(table) == 0:
+    return _sort_animals([FurVariationGroup(name, []) for name in table.animal_names])
+
+  animal = table.animal
+  gender = table.gender
+  prob = table.prob
+
+  male_total = np.bincount(animal, weights=np.where(gender != k_gender_female, prob, 0), minlength=n_animals)
+  female_total = np.bincount(animal, weights=np.where(gender != k_gender_male, prob, 0), minlength=n_animals)
+  both_total = np.bincount(animal, weights=prob, minlength=n_animals)
+  denominator = np.select([gender == k_gender_male, gender == k_gender_female], [male_total[animal], female_total[animal]], both_total[animal])
+  # round() rather than np.round, they disagree on some halves
+  percent = np.array([round(x, 2) for x in (prob / denominator * 100).tolist()])
+
+  # group rows by (animal, type), in file order within each group
+  rows = np.arange(len(table))
+  order = np.lexsort((rows, table.type, animal))
+  key_change = (np.diff(animal[order]) != 0) | (np.diff(table.type[order]) != 0)
+  starts = np.flatnonzero(np.concatenate(([True], key_change)))
+  ends = np.append(starts[1:], len(order))
+  first = order[starts]
+  last = order[ends - 1]
+  counts = ends - starts
+
+  group_animal = animal[first]
+  group_percent = percent[last]
+  sort = np.lexsort((first, -group_percent, group_animal))
+
+  # the objects are built from plain lists, indexing numpy arrays element by element is slow
+  sort = sort.tolist()
+  index = table.index.tolist()
+  order = order.tolist()
+  names = table.animal_names
+  group_index = [index[r] if n == 1 else "+".join(str(index[r]) for r in reversed(order[s:e])) for r, n, s, e in zip(first.tolist(), counts.tolist(), starts.tolist(), ends.tolist())]
+  group_gender = [GENDER_NAMES[x] if n == 1 else "both" for x, n in zip(table.gender[first].tolist(), counts.tolist())]
+  group_type = [table.type_names[x] for x in table.type[last].tolist()]
+  group_rarity = [RARITY_NAMES[x] for x in table.rarity[last].tolist()]
+  group_animal = group_animal.tolist()
+  group_percent = group_percent.tolist()
+
+  furs = [[] for _ in range(n_animals)]
+  for g in sort:
+    a = group_animal[g]
+    furs[a].append(FurVariation(names[a], group_index[g], group_type[g], group_gender[g], group_rarity[g], group_percent[g]))
+  
+  return _sort_animals([FurVariationGroup(name, animal_furs) for name, animal_furs in zip(table.animal_names, furs)])
 
-      prob = variation.prop_table[prob_index].data
-      if prob == 0:
-        continue
+def _process_fur_variations(animals: List[Animal], only_animal: str = None, debug = False) -> List[FurVariationGroup]:
+  return _fur_groups(_fur_table(animals, only_animal, debug))
+
+class AnimalState:
+  __slots__ = ("fingerprint", "group_scores", "fur_group")
+
+  def __init__(self, fingerprint: str, group_scores: Optional[AnimalGroupScores], fur_group: Optional[FurVariationGroup]) -> None:
+    self.fingerprint = fingerprint
+    self.group_scores = group_scores
+    self.fur_group = fur_group
+
+def _animal_fingerprint(animal: Animal) -> str:
+  # the animal's subtree plus the hand maintained level and diamond score that feed into its results
+  extra = json.dumps([animal_levels.get(animal.name), animal_diamonds.get(animal.name)])
+  return rtpc_node_fingerprint(animal.data).hex() + extra
+
+ANIMAL_STATE_VERSION = 1
+
+def _slots_to_dict(obj) -> dict:
+  return {name: getattr(obj, name) for name in obj.__slots__}
+
+def _slots_from_dict(cls, values: dict):
+  # rebuilt without __init__, which would look the animal up again
+  obj = cls.__new__(cls)
+  for name in cls.__slots__:
+    setattr(obj, name, values[name])
+  return obj
+
+def _animal_state_to_json(state: AnimalState) -> dict:
+  group_scores = state.group_scores
+  if group_scores is not None:
+    group_scores = _slots_to_dict(group_scores)
+    group_scores["gendered_scores"] = [_slots_to_dict(x) for x in state.group_scores.gendered_scores]
+  fur_group = state.fur_group
+  if fur_group is not None:
+    fur_group = {"animal_name": fur_group.animal_name, "furs": [_slots_to_dict(x) for x in fur_group.furs]}
+  return {"fingerprint": state.fingerprint, "group_scores": group_scores, "fur_group": fur_group}
+
+def _animal_state_from_json(values: dict) -> AnimalState:
+  group_scores = values["group_scores"]
+  if group_scores is not None:
+    group_scores = dict(group_scores, gendered_scores=[_slots_from_dict(AnimalScores, x) for x in group_scores["gendered_scores"]])
+    if group_scores["level_values"] is not None:
+      # back to the numpy scalars _update_levels made, they round differently from python floats
+      group_scores["diamond_low_weight"] = np.float64(group_scores["diamond_low_weight"])
+      group_scores["level_values"] = [(np.float64(x), np.float64(y)) for x, y in group_scores["level_values"]]
+    group_scores = _slots_from_dict(AnimalGroupScores, group_scores)
+  fur_group = values["fur_group"]
+  if fur_group is not None:
+    fur_group = FurVariationGroup(fur_group["animal_name"], [_slots_from_dict(FurVariation, x) for x in fur_group["furs"]])
+  return AnimalState(values["fingerprint"], group_scores, fur_group)
+
+def _load_animal_states(state_path: Path) -> Dict[str, AnimalState]:
+  # a missing, unreadable or outdated state file just means every animal is processed again
+  try:
+    state = json.loads(state_path.read_text())
+    if state["version"] != ANIMAL_STATE_VERSION:
+      return {}
+    return {name: _animal_state_from_json(values) for name, values in state["animals"].items()}
+  except (OSError, ValueError, KeyError, TypeError):
+    return {}
+
+def _save_animal_states(state_path: Path, states: Dict[str, AnimalState]) -> None:
+  # written next to the state file and renamed over it, so an interrupted run never leaves a partial file
+  state = {"version": ANIMAL_STATE_VERSION, "animals": {name: _animal_state_to_json(x) for name, x in states.items()}}
+  tmp_path = state_path.with_name(state_path.name + ".tmp")
+  tmp_path.write_text(json.dumps(state))
+  tmp_path.replace(state_path)
+
+def _patch_animal_details(details_path: Path, states: Dict[str, AnimalState], changed: List[str]) -> None:
+  try:
+    animal_details = json.loads(details_path.read_text())
+  except (OSError, ValueError):
+    animal_details = {}
+  
+  removed = [name for name in animal_details if name not in states]
+  for name in removed:
+    del animal_details[name]
+  for name in changed:
+    group_score = states[name].group_scores
+    if group_score is None:
+      animal_details.pop(name, None)
+      continue
+    details = _create_animal_details(group_score)
+    existing = animal_details.get(name)
+    if existing:
+      # furs are filled in by hand, keep them
+      details["diamonds"]["furs"] = existing.get("diamonds", {}).get("furs", {})
+    animal_details[name] = details
+
+  if changed or removed:
+    animal_details = dict(sorted(animal_details.items()))
+    details_path.write_text(json.dumps(animal_details, indent=2))
+
+def _refresh_animal_details(filename: str, details_path: str = "animal_details.json", state_path: str = "animal_state.json", debug = False) -> Tuple[List[AnimalGroupScores], List[FurVariationGroup], List[str]]:
+  """
+  Incremental version of _group_scores(_process_scores(...)), _process_fur_variations(...) and
+  _create_all_animal_details(...). The fingerprint and results of every animal are kept in state_path, only animals
+  whose subtree changed since the last run are processed again and only their entries in details_path are rewritten.
+  Returns the scores and furs of all animals, plus the names of the animals that were processed.
+  """
+  animal_list = _open_rtpc(filename, lazy=False)
+  animals = _get_animals(animal_list, debug)
+  state_path = Path(state_path)
+  previous = _load_animal_states(state_path)
+
+  states = {}
+  changed_animals = []
+  for animal in animals:
+    fingerprint = _animal_fingerprint(animal)
+    state = previous.get(animal.name)
+    if state is not None and state.fingerprint == fingerprint:
+      states[animal.name] = state
+    else:
+      states[animal.name] = AnimalState(fingerprint, None, None)
+      changed_animals.append(animal)
+
+  if changed_animals:
+    for group_score in _group_scores(_process_scores(changed_animals, debug=debug)):
+      states[group_score.animal_name].group_scores = group_score
+    for fur_group in _process_fur_variations(changed_animals, debug=debug):
+      states[fur_group.animal_name].fur_group = fur_group
+  
+  changed = [animal.name for animal in changed_animals]
+  _patch_animal_details(Path(details_path), states, changed)
+  if changed or len(states) != len(previous):
+    _save_animal_states(state_path, states)
 
-      if gender == "male":
-        male_prob_total += prob
-      elif gender == "female":
-        female_prob_total += prob
-      else:
-        male_prob_total += prob
-        female_prob_total += prob  
-      both_prob_total += prob
-
-      variation_details.append(FurVariation(
-        animal.name,
-        index,
-        fur_type,
-        gender,
-        rarity,
-        float(prob)
-      ))
-    
-    for variation in variation_details:
-      gender = variation.gender
-      prob = variation.prob
-      prob_percent = 0
-      demoniator = 0
-      if gender == "male":
-        demoniator = male_prob_total
-      elif gender == "female":
-        demoniator = female_prob_total
-      else:
-        demoniator = both_prob_total
-      prob_percent = round((prob / demoniator) * 100, 2)
-      variation.prob = prob_percent
-
-    furs = {}
-    for variation in variation_details:
-      fur_already_processed = variation.type in furs      
-      if fur_already_processed:
-        existing = furs[variation.type]
-        furs[variation.type] = FurVariation( 
-          animal.name,
-          f"{variation.index}+{existing.index}", 
-          variation.type,
-          "both", 
-          variation.rarity, 
-          variation.prob
-        )
-      else: 
-        furs[variation.type] = variation
-    
-    furs = [v for _,v in furs.items()]
-    furs = sorted(furs, key = lambda x: x.prob, reverse = True)  
-    animal_furs.append(FurVariationGroup(animal.name, furs))
-  return _sort_animals(animal_furs)
+  group_scores = _sort_animals([x.group_scores for x in states.values() if x.group_scores is not None])
+  fur_groups = _sort_animals([x.fur_group for x in states.values() if x.fur_group is not None])
+  return group_scores, fur_groups, changed
 
 if __name__ == "__main__":
   animal_list = _open_rtpc("global_animal_types.blo")
@@ -458,6 +690,7 @@ if __name__ == "__main__":
   scores = _process_scores(animals, debug=False)
   scores = _group_scores(scores)
   animal_details = _create_all_animal_details(scores)
+  # scores, fur_variations, changed = _refresh_animal_details("global_animal_types.blo")
   # Path("animal_details.json").write_text(json.dumps(animal_details, indent=2))
   _show_group_scores(scores)  
   # Path("levels/global_animals.json").write_text(json.dumps(_create_animal_level_dict(scores), indent=2))  
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+Randomized regression checks for the vectorized and cached code paths, comparing each with the straightforward
+implementation it replaced. Run from the repository root, next to the benchmarks:
+
+    python -m benchmarks.check --count 10000 --seed 1
+
+Each check reports ok or its first few mismatches, and any mismatch makes the run fail. Runs use a random seed
+unless --seed is given; the seed is printed so a failure can be reproduced.
+"""
+
+from deca.ff_rtpc import rtpc_from_binary, rtpc_node_fingerprint
+from deca.ff_rtpc_lru import RtpcSubtreeCache
+from deca.hashes import hash32_func, hash32_batch
+from animals import _range_quantiles, AnimalGroupScores
+import argparse
+import numpy as np
+import random
+import sys
+
+
+def check_hash32_batch(rng: random.Random, count: int):
+    """
+    hash32_batch against hash32_func, bit for bit, on random bytes and ASCII str of every length up to several
+    12 byte blocks, including the empty string and exact block multiples.
+    """
+    items = [bytes(rng.getrandbits(8) for _ in range(n)) for n in range(50)]
+    items += [''.join(chr(rng.randrange(32, 127)) for _ in range(n)) for n in range(50)]
+    for i in range(count):
+        n = rng.randrange(0, 100)
+        if i % 2:
+            items.append(bytes(rng.getrandbits(8) for _ in range(n)))
+        else:
+            items.append(''.join(chr(rng.randrange(32, 127)) for _ in range(n)))
+
+    for init_val in (0, rng.getrandbits(32)):
+        batch = hash32_batch(items, init_val).tolist()
+        for item, value in zip(items, batch):
+            expected = hash32_func(item, init_val)
+            if value != expected:
+                yield '{!r} init {}: hash32_batch {:08x} != hash32_func {:08x}'.format(item, init_val, value, expected)
+
+
+def check_range_quantiles(rng: random.Random, count: int):
+    """
+    animals._range_quantiles against np.quantile(range(low, high), q), bit for bit, on random weight ranges (in
+    hundredths, as _update_levels uses them) for every set of level cut points plus random ones.
+    """
+    cut_points = [np.array(q, dtype=np.float64) for q in AnimalGroupScores.level_quantiles.values()]
+    cut_points.append(np.array(sorted(rng.random() for _ in range(7)), dtype=np.float64))
+    ranges = [(rng.randrange(0, 100000), n) for n in range(1, 20)]
+    # lengths spread evenly over orders of magnitude, up to a 1000kg range
+    ranges += [(rng.randrange(0, 100000), int(10 ** rng.uniform(0, 5))) for _ in range(count)]
+    low = np.array([r[0] for r in ranges], dtype=np.int64)[:, None]
+    high = low + np.array([r[1] for r in ranges], dtype=np.int64)[:, None]
+
+    for q in cut_points:
+        values = _range_quantiles(low, high, q[None, :])
+        for (l, h), row in zip(zip(low[:, 0].tolist(), high[:, 0].tolist()), values):
+            expected = np.quantile(range(l, h), q)
+            if not np.array_equal(row, expected):
+                yield 'range({}, {}) q {}: {} != np.quantile {}'.format(l, h, q.tolist(), row.tolist(), expected.tolist())
+
+    try:
+        _range_quantiles(np.array([[5]]), np.array([[5]]), cut_points[0][None, :])
+        yield 'empty range(5, 5) did not raise'
+    except ValueError:
+        pass
+
+
+def check_fingerprint_lru(rng: random.Random, count: int):
+    """
+    rtpc_node_fingerprint on lazy trees of global_animal_types.blo behind small subtree caches, which evict and decode
+    nodes again while they are fingerprinted, against the fingerprints of the eager tree: the root's, then those of
+    nodes down random paths.
+    """
+    eager = rtpc_from_binary('global_animal_types.blo', fingerprint=True).root_node
+    for max_nodes in [200] + [rng.randrange(1, 5000) for _ in range(3)]:
+        lazy = rtpc_from_binary('global_animal_types.blo', lazy=True, subtree_cache=RtpcSubtreeCache(max_nodes=max_nodes)).root_node
+        if rtpc_node_fingerprint(lazy) != eager.fingerprint:
+            yield 'max_nodes {}: root fingerprint differs'.format(max_nodes)
+        for _ in range(count // 100):
+            a, b = eager, lazy
+            path = []
+            while a.child_table and rng.random() < 0.8:
+                i = rng.randrange(len(a.child_table))
+                a, b = a.child_table[i], b.child_table[i]
+                path.append(i)
+            if rtpc_node_fingerprint(b) != a.fingerprint:
+                yield 'max_nodes {}: fingerprint differs at child path {}'.format(max_nodes, path)
+
+
+CHECKS = {
+    'hash32_batch': check_hash32_batch,
+    'range_quantiles': check_range_quantiles,
+    'fingerprint_lru': check_fingerprint_lru,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.check', description='Run the regression checks.')
+    parser.add_argument('names', nargs='*', help='checks to run (default all: {})'.format(', '.join(CHECKS)))
+    parser.add_argument('-n', '--count', type=int, default=2000, help='random cases per check (default 2000)')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='random seed (default random, printed)')
+    args = parser.parse_args(argv)
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    print('seed {}'.format(seed))
+    status = 0
+    for name in args.names or CHECKS:
+        if name not in CHECKS:
+            parser.error('unknown check {!r}'.format(name))
+        failures = list(CHECKS[name](random.Random(seed), args.count))
+        print('{:20s} {}'.format(name, 'FAILED {}'.format(len(failures)) if failures else 'ok'))
+        for failure in failures[:10]:
+            print('    ' + failure)
+        if failures:
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
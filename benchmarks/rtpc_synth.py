@@ -0,0 +1,119 @@
+"""
+Synthetic RTPC files for the benchmarks. rtpc_to_binary writes a decoded tree back out in the same layout the decoder
+expects: each node's property table, padded to 4 bytes, followed by its child headers, then the payloads of its
+properties, with strings stored once. rtpc_scaled repeats the entries of a list node (the AnimalTypesList of
+global_animal_types.blo) so a file has the same shape at any multiple of the original size.
+"""
+
+from deca.ff_rtpc import *
+from deca.ff_rtpc import _prop_array_codes, _prop_f32_counts
+import argparse
+import sys
+
+
+def _align(buf: bytearray, n=4):
+    buf.extend(b'\00' * ((n - len(buf) % n) % n))
+
+
+def _payload(buf: bytearray, prop_type, value, strings):
+    # append the payload of an offset based property, returning its offset
+    if prop_type == k_type_str:
+        value = b'' if value is None else value.encode('utf-8') if isinstance(value, str) else value
+        offset = strings.get(value)
+        if offset is None:
+            offset = strings[value] = len(buf)
+            buf.extend(value + b'\00')
+        return offset
+
+    _align(buf)
+    offset = len(buf)
+    if prop_type in _prop_f32_counts:
+        buf.extend(struct.pack('<{}f'.format(len(value)), *value))
+    elif prop_type in _prop_array_codes:
+        buf.extend(struct.pack('<I{}{}'.format(len(value), _prop_array_codes[prop_type]), len(value), *value))
+    elif prop_type == k_type_objid:
+        buf.extend(struct.pack('<Q', value))
+    elif prop_type == k_type_event:
+        buf.extend(struct.pack('<I{}Q'.format(len(value)), len(value), *value))
+    else:
+        raise EDecaErrorParse('NOT HANDLED {}'.format(prop_type))
+    return offset
+
+
+def rtpc_to_binary(root: RtpcNode, version=3) -> bytes:
+    """
+    Encode the tree under root as an RTPC file. Nodes are laid out depth first, in child order.
+    """
+    buf = bytearray(b'RTPC' + struct.pack('<I', version) + b'\00' * 12)
+    strings = {}
+    stack = [(root, 8)]
+    while stack:
+        node, header_pos = stack.pop()
+        props = node.prop_table
+        children = node.child_table
+
+        _align(buf)
+        data_offset = len(buf)
+        struct.pack_into('<IIHH', buf, header_pos, node.name_hash, data_offset, len(props), len(children))
+        buf.extend(b'\00' * (9 * len(props)))
+        _align(buf)
+        children_pos = len(buf)
+        buf.extend(b'\00' * (12 * len(children)))
+
+        for i, prop in enumerate(props):
+            if prop.type == k_type_f32:
+                data_raw = struct.unpack('<I', struct.pack('<f', prop.data))[0]
+            elif prop.type in (k_type_str, k_type_objid, k_type_event) or \
+                    prop.type in _prop_f32_counts or prop.type in _prop_array_codes:
+                data_raw = _payload(buf, prop.type, prop.data, strings)
+            else:
+                data_raw = prop.data
+            struct.pack_into('<IIB', buf, data_offset + 9 * i, prop.name_hash, data_raw, prop.type)
+
+        stack.extend((child, children_pos + 12 * i) for i, child in reversed(list(enumerate(children))))
+    return bytes(buf)
+
+
+class _ListNode:
+    # stands in for a list node with its entries repeated, rtpc_to_binary only reads these attributes
+    def __init__(self, node: RtpcNode, children):
+        self.name_hash = node.name_hash
+        self.prop_table = node.prop_table
+        self.child_table = children
+
+
+def rtpc_scaled(root: RtpcNode, scale: int, list_index=0):
+    """
+    Root of a tree like root but with the children of its list_index-th child repeated scale times.
+    """
+    entries = root.child_table[list_index]
+    children = list(root.child_table)
+    children[list_index] = _ListNode(entries, list(entries.child_table) * scale)
+    return _ListNode(root, children)
+
+
+def rtpc_synth(template, scale: int) -> bytes:
+    """
+    An RTPC file shaped like the template file (a path or anything rtpc_from_binary accepts) at scale times its size.
+    """
+    rtpc = rtpc_from_binary(template)
+    return rtpc_to_binary(rtpc_scaled(rtpc.root_node, scale), rtpc.version)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.rtpc_synth', description='Write a synthetic RTPC file shaped like a template.')
+    parser.add_argument('output', help='file to write')
+    parser.add_argument('-s', '--scale', type=int, default=1, help='multiple of the template size (default 1)')
+    parser.add_argument('-t', '--template', default='global_animal_types.blo', help='template RTPC file')
+    args = parser.parse_args(argv)
+
+    data = rtpc_synth(args.template, args.scale)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+    print('{}: {} bytes'.format(args.output, len(data)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Benchmark suite for the RTPC decoder and the animals.py pipeline. Run from the repository root:
+
+    python -m benchmarks.run --scales 1,10 --output bench.json --baseline benchmarks/baseline.json
+
+Every benchmark is timed repeatedly and reported as min/median seconds in the JSON output. Scaled inputs are synthetic
+files shaped like global_animal_types.blo (see benchmarks.rtpc_synth). With --baseline the minimum of each
+benchmark is compared with the stored run, and any benchmark slower than the baseline by more than --tolerance makes
+the run fail. --save-baseline stores the current run as the new baseline; baselines are machine specific. Scale 100
+works too, but fully decoding it takes several GB of memory.
+"""
+
+from deca.ff_rtpc import *
+from deca.ff_rtpc_cache import RtpcCache, rtpc_from_binary_cached
+from deca.ff_rtpc_columns import rtpc_columns_from_binary
+from deca.file import ArchiveFile
+from benchmarks.rtpc_synth import rtpc_synth
+import animals
+import argparse
+import copy
+import io
+import json
+import numpy as np
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+
+def bench_time(fn, min_time=0.2, min_repeat=3, max_repeat=1000):
+    """
+    Seconds taken by each of several calls of fn, called until min_time has passed and at least min_repeat times.
+    """
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeat and (len(times) < min_repeat or time.perf_counter() - start < min_time):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return times
+
+
+def _archive_file_headers(data, node_positions, prop_positions, string_offsets):
+    # the classic way of reading the file: seek and read field by field through ArchiveFile
+    with ArchiveFile(io.BytesIO(data)) as f:
+        for pos in node_positions:
+            f.seek(pos)
+            f.read_u32()
+            f.read_u32()
+            f.read_u16()
+            f.read_u16()
+        for pos in prop_positions:
+            f.seek(pos)
+            f.read_u32()
+            f.read_u32()
+            f.read_u8()
+        for pos in string_offsets:
+            f.seek(pos)
+            f.read_strz()
+
+
+def _prop_from_binary(data, prop_positions):
+    prop = RtpcProperty()
+    for pos in prop_positions:
+        rtpc_prop_from_binary(data, pos, prop)
+
+
+def _lazy_one_animal(data, animal_name):
+    # a lazy decode and what one animal's scores need: every animal's name, then that animal's subtree
+    root = rtpc_from_binary(data, lazy=True).root_node
+    return animals._process_scores(animals._get_animals(root.child_table[0]), only_animal=animal_name)
+
+
+def _cached_one_animal(path, cache, animal_name):
+    # as _lazy_one_animal, through a warm snapshot cache
+    root = rtpc_from_binary_cached(path, cache=cache).root_node
+    return animals._process_scores(animals._get_animals(root.child_table[0]), only_animal=animal_name)
+
+
+def _walk(node):
+    # touch every property table, so a lazy tree is fully built
+    node.prop_table
+    for child in node.child_table:
+        _walk(child)
+
+
+def _hash32(names):
+    for name in names:
+        hash32_func(name)
+
+
+def _update_levels(groups):
+    for group in groups:
+        group.update_levels()
+
+
+def bench_suite(template='global_animal_types.blo', scales=(1, 10), min_time=0.2):
+    """
+    Run every benchmark, returning {name: {'min': s, 'median': s, 'repeat': n, ...}}.
+    """
+    results = {}
+
+    def run(name, fn, **info):
+        times = bench_time(fn, min_time)
+        results[name] = dict(min=min(times), median=statistics.median(times), repeat=len(times), **info)
+        print('{:40s} min {:10.6f}s  median {:10.6f}s  x{}'.format(
+            name, results[name]['min'], results[name]['median'], len(times)), file=sys.stderr)
+
+    names = ['animal_{}_{}'.format(i, j) for i in range(100) for j in ('score_min', 'weight_max', 'type_name')]
+    run('hash32_func[{}]'.format(len(names)), lambda: _hash32(names))
+
+    animal_name = animals._get_animals(rtpc_from_binary(template, lazy=True).root_node.child_table[0])[0].name
+    tmp_dir = tempfile.TemporaryDirectory()
+
+    for scale in scales:
+        data = rtpc_synth(template, scale)
+        tag = '[{}x]'.format(scale)
+        info = dict(scale=scale, bytes=len(data))
+
+        # the cached loads read a file, through a cache warmed by one load
+        path = os.path.join(tmp_dir.name, 'rtpc{}.bin'.format(scale))
+        with open(path, 'wb') as f:
+            f.write(data)
+        cache = RtpcCache(os.path.join(tmp_dir.name, 'cache'))
+        rtpc_from_binary_cached(path, cache=cache)
+
+        columns = rtpc_columns_from_binary(data)
+        node_positions = _node_header_positions(columns)
+        prop_positions = columns.prop_pos.tolist()
+        string_offsets = sorted(set(columns.prop_u32[columns.prop_type == k_type_str].tolist()))
+        del columns
+
+        run('rtpc_from_binary' + tag, lambda: rtpc_from_binary(data), **info)
+        run('rtpc_from_binary_lazy_one_animal' + tag, lambda: _lazy_one_animal(data, animal_name), **info)
+        run('rtpc_from_binary_cached_walk' + tag, lambda: _walk(rtpc_from_binary_cached(path, cache=cache).root_node), **info)
+        run('rtpc_from_binary_cached_one_animal' + tag, lambda: _cached_one_animal(path, cache, animal_name), **info)
+        run('rtpc_prop_from_binary' + tag, lambda: _prop_from_binary(data, prop_positions), props=len(prop_positions), **info)
+        # the batch header gather of a full decode, by NumPy fancy indexing and by the compiled kernel
+        raw = np.frombuffer(data, dtype=np.uint8)
+        positions = np.array(prop_positions, dtype=np.int64)
+        run('prop_header_gather' + tag, lambda: rtpc_prop_headers_gather(raw, positions, jit=False), props=len(positions), **info)
+        if ff_jit_enabled:
+            run('prop_header_gather_jit' + tag, lambda: rtpc_prop_headers_gather(raw, positions, jit=True), props=len(positions), **info)
+        run('archive_file_reads' + tag, lambda: _archive_file_headers(data, node_positions, prop_positions, string_offsets), **info)
+
+        root = rtpc_from_binary(data).root_node
+        animal_list = animals._get_animals(root.child_table[0])
+        run('process_scores' + tag, lambda: animals._process_scores(animal_list), animals=len(animal_list), **info)
+        run('process_fur_variations' + tag, lambda: animals._process_fur_variations(animal_list), animals=len(animal_list), **info)
+
+        # groups are per animal name, scaled copies of an animal would merge, so the groups are copied instead
+        groups = animals._group_scores(animals._process_scores(animals._get_animals(
+            rtpc_from_binary(template).root_node.child_table[0])))
+        groups = [copy.copy(group) for i in range(scale) for group in groups]
+        run('update_levels' + tag, lambda: _update_levels(groups), groups=len(groups), **info)
+        run('update_levels_batch' + tag, lambda: animals._update_levels(groups), groups=len(groups), **info)
+        del root, animal_list, groups
+
+    tmp_dir.cleanup()
+    return results
+
+
+def _node_header_positions(columns):
+    # file position of every node header: the root's at 8, children's after their parent's property table
+    child_start = columns.node_data_offset.astype(np.int64) + 9 * columns.node_prop_count.astype(np.int64)
+    child_start += (4 - child_start % 4) % 4
+    positions = [8]
+    seen = {}
+    for parent in columns.node_parent[1:].tolist():
+        i = seen.get(parent, 0)
+        seen[parent] = i + 1
+        positions.append(int(child_start[parent]) + 12 * i)
+    return positions
+
+
+def bench_compare(results, baseline, tolerance):
+    """
+    Names of the benchmarks slower than in baseline by more than tolerance (0.25 = 25%), with their ratios.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print('{:40s} not in baseline'.format(name), file=sys.stderr)
+            continue
+        ratio = result['min'] / base['min'] if base['min'] > 0 else 1.0
+        result['baseline_ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Run the benchmark suite.')
+    parser.add_argument('-s', '--scales', default='1,10', help='comma separated input scales (default 1,10)')
+    parser.add_argument('-t', '--template', default='global_animal_types.blo', help='template RTPC file')
+    parser.add_argument('-o', '--output', help='write the results as JSON to this file instead of stdout')
+    parser.add_argument('-b', '--baseline', help='baseline JSON file to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds spent timing each benchmark')
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(',') if s]
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'jit': ff_jit_enabled,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': bench_suite(args.template, scales, args.min_time),
+    }
+
+    status = 0
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = bench_compare(report['results'], baseline, args.tolerance)
+        for name, ratio in regressions:
+            print('REGRESSION {:40s} {:.2f}x slower than baseline'.format(name, ratio), file=sys.stderr)
+        if regressions:
+            status = 1
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.baseline or 'benchmarks/baseline.json', 'w') as f:
+            f.write(text + '\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,10 @@
 import numpy as np
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
 
 class FFError(Exception):
     pass
@@ -8,18 +13,30 @@ class FFError(Exception):
 params = {
     'inline': 'always',
     'nogil': True,
+    'cache': True,
 }
 
+# readers are compiled with numba when it is installed, otherwise they are plain python. Both take the same
+# (buffer, length) pairs, bytes or uint8 arrays, and return python scalars and lists.
+ff_jit_enabled = numba is not None
+
+
+def ff_jit(f):
+    if ff_jit_enabled:
+        return numba.njit(**params)(f)
+    return f
+
+
+@ff_jit
 def raise_error():
     raise FFError('ff_read: not enough data')
 
 
+@ff_jit
 def ff_read(bufn, pos, n):
-    if bufn[1] >= (pos + n):
-        ret = bufn[0][pos:(pos + n)]
-        return ret, pos + n
-    else:
-        return raise_error()
+    if bufn[1] < (pos + n):
+        raise_error()
+    return bufn[0][pos:(pos + n)], pos + n
 
 
 def make_read_one(data_type):
@@ -31,9 +48,9 @@ def make_read_one(data_type):
         if new_pos > bufn[1]:
             raise_error()
         v = np.frombuffer(bufn[0][pos:new_pos], dtype=dt)
-        return v[0], new_pos
+        return v[0].item(), new_pos
 
-    return f
+    return ff_jit(f)
 
 
 def make_read_many(data_type):
@@ -45,9 +62,9 @@ def make_read_many(data_type):
         if new_pos > bufn[1]:
             raise_error()
         v = np.frombuffer(bufn[0][pos:new_pos], dtype=dt)
-        return list(v), new_pos
+        return [v[i].item() for i in range(count)], new_pos
 
-    return f
+    return ff_jit(f)
 
 
 ff_read_u8 = make_read_one(np.uint8)
@@ -73,8 +90,9 @@ ff_read_f32s = make_read_many(np.float32)
 ff_read_f64s = make_read_many(np.float64)
 
 
+@ff_jit
 def ff_read_strz(bufn, pos):
     pos0 = pos
-    while bufn[0][pos] != 0 and pos < bufn[1]:
+    while pos < bufn[1] and bufn[0][pos] != 0:
         pos += 1
     return bufn[0][pos0:pos], pos
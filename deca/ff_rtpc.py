@@ -1,7 +1,13 @@
-from deca.file import ArchiveFile
+from deca.errors import EDecaErrorParse, EDecaIncorrectFileFormat, EDecaOutOfData
 from deca.fast_file_2 import *
 from deca.hashes import hash32_func
+import array
+import collections
+import hashlib
+import mmap
+import os
 import struct
+import sys
 from enum import IntEnum
 from typing import List, Optional
 
@@ -65,6 +71,17 @@ PropType_names = [
     'unk_16',
 ]
 
+class RtpcEvent(IntEnum):
+    enter_node = 0
+    prop = 1
+    exit_node = 2
+
+
+k_event_enter_node = RtpcEvent.enter_node.value
+k_event_prop = RtpcEvent.prop.value
+k_event_exit_node = RtpcEvent.exit_node.value
+
+
 h_prop_class = hash32_func('_class')
 h_prop_class_hash = hash32_func('_class_hash')
 h_prop_name = hash32_func('name')
@@ -117,9 +134,22 @@ class RtpcProperty:
         # return '0x{:08x}: {} = {}'.format(self.name_hash, PropType.type_names[self.type], self.data,)
 
 
+def _truncated(e: struct.error):
+    # a struct read past the end of a buffer, as the EDecaOutOfData the eager decoder raises
+    return EDecaOutOfData('RTPC data truncated: {}'.format(e))
+
+
 class RtpcNode:
+    """
+    When decoded lazily a node only holds its header and the source buffer, prop_table/prop_map and
+    child_table/child_map are decoded from the buffer on first access.
+    fingerprint is the content digest of the node's subtree once computed, see rtpc_node_fingerprint.
+    A lazy node with a subtree cache (see deca.ff_rtpc_lru) keeps nothing itself, decoded tables live in the cache.
+    A lazy node over columns (see deca.ff_rtpc_columns.RtpcColumnsSource) has its tables built from them instead.
+    """
     __slots__ = (
-        'name_hash', 'data_offset', 'prop_count', 'child_count', 'prop_table', 'prop_map', 'child_table', 'child_map'
+        'name_hash', 'data_offset', 'prop_count', 'child_count', 'fingerprint',
+        '_prop_table', '_prop_map', '_child_table', '_child_map', '_buf', '_strings', '_cache'
     )
 
     def __init__(self):
@@ -127,10 +157,74 @@ class RtpcNode:
         self.data_offset = None
         self.prop_count = None
         self.child_count = None
-        self.prop_table: List[RtpcProperty] = []
-        self.prop_map = {}
-        self.child_table: List[RtpcNode] = []
-        self.child_map = {}
+        self.fingerprint: Optional[bytes] = None
+        self._prop_table: Optional[List[RtpcProperty]] = []
+        self._prop_map = {}
+        self._child_table: Optional[List[RtpcNode]] = []
+        self._child_map = {}
+        self._buf = None
+        self._strings = None
+        self._cache = None
+
+    @property
+    def prop_table(self) -> List[RtpcProperty]:
+        if self._prop_table is None:
+            try:
+                if self._cache is not None:
+                    return self._cache.props(self)[0]
+                rtpc_node_props_from_binary(self._buf, self, self._strings)
+            except struct.error as e:
+                raise _truncated(e) from e
+        return self._prop_table
+
+    @prop_table.setter
+    def prop_table(self, value):
+        self._prop_table = value
+
+    @property
+    def prop_map(self):
+        if self._prop_map is None:
+            if self._cache is not None:
+                try:
+                    return self._cache.props(self)[1]
+                except struct.error as e:
+                    raise _truncated(e) from e
+            self._prop_map = {prop.name_hash: prop for prop in self.prop_table}
+        return self._prop_map
+
+    @prop_map.setter
+    def prop_map(self, value):
+        self._prop_map = value
+
+    @property
+    def child_table(self) -> List['RtpcNode']:
+        if self._child_table is None:
+            try:
+                if self._cache is not None:
+                    return self._cache.children(self)[0]
+                rtpc_node_children_from_binary(self._buf, self, lazy=True, strings=self._strings)
+            except struct.error as e:
+                raise _truncated(e) from e
+        return self._child_table
+
+    @child_table.setter
+    def child_table(self, value):
+        self._child_table = value
+
+    @property
+    def child_map(self):
+        if self._child_map is None:
+            if self._cache is not None:
+                try:
+                    return self._cache.children(self)[1]
+                except struct.error as e:
+                    raise _truncated(e) from e
+            self._child_map = {child.name_hash: child for child in self.child_table}
+        return self._child_map
+
+    @child_map.setter
+    def child_map(self, value):
+        self._child_map = value
 
     def __repr__(self):
         return '{:08x} pc:{} cc:{} @ {} {:08x}'.format(
@@ -147,154 +241,543 @@ class Rtpc:
         self.magic = None
         self.version = None
         self.root_node: Optional[RtpcNode] = None
+        self.strings: Optional[RtpcStringTable] = None
+        self.class_index = None
+
+    def select(self, path: str):
+        """
+        Lazy iterator over the nodes matching a selector such as '*/CAnimalType[@name="moose"]//0x1234abcd', see
+        deca.ff_rtpc_select.
+        """
+        from deca.ff_rtpc_select import rtpc_select
+        return rtpc_select(self, path)
+
+
+_node_header = struct.Struct('<IIHH')
+_prop_header = struct.Struct('<IIB')
+_u32 = struct.Struct('<I')
+_f32 = struct.Struct('<f')
+_u64 = struct.Struct('<Q')
+
+# fixed size f32 payloads, element count by type
+_prop_f32_counts = {
+    k_type_vec2: 2,
+    k_type_vec3: 3,
+    k_type_vec4: 4,
+    k_type_mat3x3: 9,
+    k_type_mat4x4: 16,
+}
+
+# counted array payloads, array/struct element code by type
+_prop_array_codes = {
+    k_type_array_u32: 'I',
+    k_type_array_f32: 'f',
+    k_type_array_u8: 'B',
+}
+
+# packed 9-byte property header, as stored in a node's property table
+prop_header_dtype = np.dtype([('name_hash', '<u4'), ('data_raw', '<u4'), ('type', 'u1')])
+
+# types whose data_raw is an offset to the payload rather than the value itself
+_prop_offset_types = frozenset([k_type_str, k_type_objid, k_type_event] + list(_prop_f32_counts) + list(_prop_array_codes))
+
+# per type lookup tables, indexed by the u8 type field
+_prop_is_offset = np.zeros(256, dtype=bool)
+_prop_is_offset[list(_prop_offset_types)] = True
+_prop_is_known = np.zeros(256, dtype=bool)
+_prop_is_known[:k_type_unk_16 + 1] = True
+_prop_is_known[k_type_depreciated_12] = False
+
+# byte index ranges used to gather records and fixed size payloads
+_prop_header_bytes = np.arange(_prop_header.size)
+_prop_f32_bytes = {prop_type: np.arange(4 * n) for prop_type, n in _prop_f32_counts.items()}
+
+
+def rtpc_buffer(f_raw):
+    """
+    Return a random access buffer over a whole RTPC file. Paths are memory mapped, bytes and mmap objects are used
+    as is, and file objects are read completely. Every decoder below works on absolute offsets into this buffer.
+    """
+    if isinstance(f_raw, (str, os.PathLike)):
+        with open(f_raw, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    elif isinstance(f_raw, (bytes, bytearray, mmap.mmap)):
+        return f_raw
+    elif isinstance(f_raw, memoryview):
+        # memoryview has no find(), which the string reader relies on
+        return f_raw.tobytes()
+    else:
+        return f_raw.read()
+
+
+def rtpc_strz_from_binary(buf, pos):
+    end = buf.find(b'\00', pos)
+    if end < 0:
+        return None
+    return bytes(buf[pos:end])
+
+
+def rtpc_array_from_binary(buf, pos, typecode, n):
+    """
+    Read n little endian values at pos into an array.array, copied in one go from the buffer.
+    """
+    v = array.array(typecode)
+    end = pos + v.itemsize * n
+    if end > len(buf):
+        raise EDecaOutOfData('RTPC array at {} runs past end of data'.format(pos))
+    v.frombytes(memoryview(buf)[pos:end])
+    if sys.byteorder != 'little':
+        v.byteswap()
+    return v
+
+
+class RtpcStringTable:
+    """
+    The strings of one RTPC buffer, each decoded once per offset; properties that share an offset share the value.
+    With intern=True equal strings at different offsets are also shared, with decode=True values are interned str
+    rather than bytes.
+    """
+    def __init__(self, buf, intern=False, decode=False):
+        self.buf = buf
+        self.intern = intern
+        self.decode = decode
+        self._by_offset = {}
+        self._interned = {}
+
+    def __len__(self):
+        return len(self._by_offset)
+
+    def get(self, offset):
+        try:
+            return self._by_offset[offset]
+        except KeyError:
+            pass
+
+        value = rtpc_strz_from_binary(self.buf, offset)
+        if value is not None:
+            if self.decode:
+                value = sys.intern(value.decode('utf-8'))
+            elif self.intern:
+                value = self._interned.setdefault(value, value)
+        self._by_offset[offset] = value
+        return value
+
+
+def rtpc_prop_value_from_binary(buf, pos, data_raw, prop_type, strings: Optional[RtpcStringTable] = None):
+    """
+    Decode the value of the property whose header is at pos, given its data_raw and type fields. Strings are looked
+    up in strings when given.
+    """
+    if prop_type == k_type_none or prop_type == k_type_u32:
+        return data_raw
+    elif prop_type == k_type_f32:
+        return _f32.unpack_from(buf, pos + 4)[0]
+    elif prop_type == k_type_str:
+        if strings is not None:
+            return strings.get(data_raw)
+        return rtpc_strz_from_binary(buf, data_raw)
+    elif prop_type in _prop_f32_counts:
+        return list(struct.unpack_from('<{}f'.format(_prop_f32_counts[prop_type]), buf, data_raw))
+    elif prop_type in _prop_array_codes:
+        n = _u32.unpack_from(buf, data_raw)[0]
+        return rtpc_array_from_binary(buf, data_raw + 4, _prop_array_codes[prop_type], n)
+    elif prop_type == k_type_objid:
+        return _u64.unpack_from(buf, data_raw)[0]
+    elif prop_type == k_type_event:
+        n = _u32.unpack_from(buf, data_raw)[0]
+        return rtpc_array_from_binary(buf, data_raw + 4, 'Q', n)
+    elif prop_type == k_type_unk_15:
+        return data_raw
+    elif prop_type == k_type_unk_16:
+        return data_raw
+    else:
+        raise EDecaErrorParse('NOT HANDLED {}'.format(prop_type))
+
+
+def rtpc_prop_from_binary(buf, pos, prop, strings: Optional[RtpcStringTable] = None):
+    prop.pos = pos
+    prop.name_hash, prop.data_raw, prop.type = _prop_header.unpack_from(buf, pos)
+    prop.data = rtpc_prop_value_from_binary(buf, pos, prop.data_raw, prop.type, strings)
+    prop.data_pos = prop.data_raw if prop.type in _prop_offset_types else pos + 4
+    return pos + _prop_header.size
+
+
+def rtpc_node_header_from_binary(buf, pos, node):
+    node.name_hash, node.data_offset, node.prop_count, node.child_count = _node_header.unpack_from(buf, pos)
+    return pos + _node_header.size
 
 
-def rtpc_prop_from_binary(f, prop):
-    prop.pos = f.tell()
-    prop.name_hash = f.read_u32()
-    prop.data_pos = f.tell()
-    prop.data_raw = f.read_u32()
-    prop.type = f.read_u8()
-
-    prop.data = prop.data_raw
-
-    raw_buf = struct.pack('I', prop.data_raw)
-    if prop.type == k_type_none:
-        pass
-    elif prop.type == k_type_u32:
-        prop.data = struct.unpack('I', raw_buf)[0]
-    elif prop.type == k_type_f32:
-        prop.data = struct.unpack('f', raw_buf)[0]
-    elif prop.type == k_type_str:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        prop.data = f.read_strz()
-        f.seek(opos)
-    elif prop.type == k_type_vec2:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        prop.data = list(f.read_f32(2))
-        f.seek(opos)
-    elif prop.type == k_type_vec3:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        prop.data = list(f.read_f32(3))
-        f.seek(opos)
-    elif prop.type == k_type_vec4:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        prop.data = list(f.read_f32(4))
-        f.seek(opos)
-    elif prop.type == k_type_mat3x3:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        prop.data = list(f.read_f32(9))
-        f.seek(opos)
-    elif prop.type == k_type_mat4x4:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        prop.data = list(f.read_f32(16))
-        f.seek(opos)
-    elif prop.type == k_type_array_u32:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        n = f.read_u32()
-        prop.data = []
-        if n > 0:
-            prop.data = list(f.read_u32(n))
-        f.seek(opos)
-    elif prop.type == k_type_array_f32:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        n = f.read_u32()
-        prop.data = []
-        if n > 0:
-            prop.data = list(f.read_f32(n))
-        f.seek(opos)
-    elif prop.type == k_type_array_u8:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        n = f.read_u32()
-        prop.data = []
-        if n > 0:
-            prop.data = list(f.read_u8(n))
-        f.seek(opos)
-    elif prop.type == k_type_objid:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        prop.data = f.read_u64()
-        f.seek(opos)
-    elif prop.type == k_type_event:
-        opos = f.tell()
-        prop.data_pos = prop.data_raw
-        f.seek(prop.data_raw)
-        n = f.read_u32()
-        prop.data = []
-        for i in range(n):
-            prop.data.append(f.read_u64())
-        f.seek(opos)
-    elif prop.type == k_type_unk_15:
-        pass
-    elif prop.type == k_type_unk_16:
-        pass
+def rtpc_node_children_offset(node):
+    #  children 4-byte aligned
+    pos = node.data_offset + node.prop_count * _prop_header.size
+    return pos + (4 - (pos % 4)) % 4
+
+
+def rtpc_prop_positions(offsets, counts):
+    """
+    Absolute positions of every property of the property tables at offsets with counts entries, concatenated.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    index = np.arange(counts.sum(), dtype=np.int64) - np.repeat(starts, counts)
+    return np.repeat(np.asarray(offsets, dtype=np.int64), counts) + index * _prop_header.size
+
+
+def rtpc_check_positions(buf_len, positions, size, what='property table'):
+    # raise EDecaOutOfData unless every size byte record at positions lies inside the buffer
+    if len(positions) and (positions.min() < 0 or positions.max() + size > buf_len):
+        raise EDecaOutOfData('RTPC {} runs past end of data'.format(what))
+
+
+# below this many properties the NumPy gather is at least as fast, counting the compiled kernel's load from the numba
+# cache; above it the kernel is several times faster (see the prop_header_gather benchmarks)
+k_rtpc_jit_gather_min = 100000
+
+
+@ff_jit
+def ff_rtpc_read_prop_headers(raw, positions, name_hash, data_raw, prop_type):
+    # fill the three output arrays with the headers of the properties at positions, which must lie inside raw
+    for i in range(len(positions)):
+        p = positions[i]
+        name_hash[i] = raw[p] | (np.uint32(raw[p + 1]) << 8) | (np.uint32(raw[p + 2]) << 16) | (np.uint32(raw[p + 3]) << 24)
+        data_raw[i] = raw[p + 4] | (np.uint32(raw[p + 5]) << 8) | (np.uint32(raw[p + 6]) << 16) | (np.uint32(raw[p + 7]) << 24)
+        prop_type[i] = raw[p + 8]
+
+
+def rtpc_prop_headers_gather(raw, positions, jit=None):
+    """
+    The property header records at positions in raw (a uint8 array), gathered with NumPy fancy indexing, or with the
+    compiled kernel when jit is True. By default the kernel is used for batches of k_rtpc_jit_gather_min or more
+    properties when numba is installed.
+    """
+    if jit is None:
+        jit = ff_jit_enabled and len(positions) >= k_rtpc_jit_gather_min
+    if jit:
+        records = np.empty(len(positions), dtype=prop_header_dtype)
+        ff_rtpc_read_prop_headers(raw, positions, records['name_hash'], records['data_raw'], records['type'])
+        return records
+    return raw[positions[:, None] + _prop_header_bytes].view(prop_header_dtype)[:, 0]
+
+
+def rtpc_prop_values_from_binary(buf, positions, strings: Optional[RtpcStringTable] = None):
+    """
+    Decode the properties at positions (see rtpc_prop_positions) in one batch. Returns the structured header records
+    and a list with the decoded value of each property. Inline u32/f32 values are reinterpreted in bulk, fixed size
+    f32 payloads are gathered in bulk and only strings and counted arrays are decoded one at a time.
+    """
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    rtpc_check_positions(len(raw), positions, _prop_header.size)
+    if len(positions) and np.all(np.diff(positions) == _prop_header.size):
+        # a single contiguous table, view it in place
+        records = np.frombuffer(buf, dtype=prop_header_dtype, count=len(positions), offset=int(positions[0]))
     else:
-        raise Exception('NOT HANDLED {}'.format(prop.type))
+        records = rtpc_prop_headers_gather(raw, positions)
+
+    data_raw = records['data_raw']
+    types = records['type']
+
+    if not _prop_is_known[types].all():
+        raise EDecaErrorParse('NOT HANDLED {}'.format(types[~_prop_is_known[types]][0]))
+
+    data = data_raw.tolist()
+
+    idx = np.flatnonzero(types == k_type_f32)
+    if len(idx):
+        for i, v in zip(idx.tolist(), data_raw.view('<f4')[idx].tolist()):
+            data[i] = v
+
+    idx = np.flatnonzero(_prop_is_offset[types])
+    if len(idx):
+        sub_types = types[idx]
+        is_fixed = np.zeros(len(idx), dtype=bool)
+        for prop_type, n in _prop_f32_counts.items():
+            mask = sub_types == prop_type
+            if mask.any():
+                is_fixed |= mask
+                sub_idx = idx[mask]
+                offsets = data_raw[sub_idx].astype(np.int64)
+                rtpc_check_positions(len(raw), offsets, 4 * n, 'property payload')
+                values = raw[offsets[:, None] + _prop_f32_bytes[prop_type]].view('<f4').tolist()
+                for i, v in zip(sub_idx.tolist(), values):
+                    data[i] = v
+
+        for i, prop_type in zip(idx[~is_fixed].tolist(), sub_types[~is_fixed].tolist()):
+            data[i] = rtpc_prop_value_from_binary(buf, None, data[i], prop_type, strings)
+
+    return records, data
+
+
+def rtpc_props_from_values(positions, records, data):
+    is_offset = _prop_is_offset[records['type']].tolist()
+    props = []
+    for pos, (name_hash, data_raw, prop_type), offset, value in zip(positions.tolist(), records.tolist(), is_offset, data):
+        prop = RtpcProperty()
+        prop.pos = pos
+        prop.name_hash = name_hash
+        prop.data_pos = data_raw if offset else pos + 4
+        prop.data_raw = data_raw
+        prop.type = prop_type
+        prop.data = value
+        props.append(prop)
+    return props
+
 
+def rtpc_prop_table_from_binary(buf, pos, count, strings: Optional[RtpcStringTable] = None):
+    positions = np.arange(pos, pos + count * _prop_header.size, _prop_header.size, dtype=np.int64)
+    records, data = rtpc_prop_values_from_binary(buf, positions, strings)
+    return rtpc_props_from_values(positions, records, data)
 
-def rtpc_node_from_binary(f, node):
-    node.name_hash = f.read_u32()
-    node.data_offset = f.read_u32()
-    node.prop_count = f.read_u16()
-    node.child_count = f.read_u16()
 
-    old_p = f.tell()
-    f.seek(node.data_offset)
+def rtpc_node_props_from_binary(buf, node, strings: Optional[RtpcStringTable] = None):
     # read properties
-    node.prop_table = []
-    for i in range(node.prop_count):
-        prop = RtpcProperty()
-        rtpc_prop_from_binary(f, prop)
-        node.prop_table.append(prop)
-        node.prop_map[prop.name_hash] = prop
+    node.prop_table = rtpc_prop_table_from_binary(buf, node.data_offset, node.prop_count, strings)
+    node.prop_map = {prop.name_hash: prop for prop in node.prop_table}
 
-    #  children 4-byte aligned
-    pos = f.tell()
-    f.seek(pos + (4 - (pos % 4)) % 4)
 
+def rtpc_nodes_props_from_binary(buf, nodes, strings: Optional[RtpcStringTable] = None):
+    # read the properties of many nodes in one batch
+    counts = [node.prop_count for node in nodes]
+    positions = rtpc_prop_positions([node.data_offset for node in nodes], counts)
+    records, data = rtpc_prop_values_from_binary(buf, positions, strings)
+    props = rtpc_props_from_values(positions, records, data)
+    start = 0
+    for node, count in zip(nodes, counts):
+        node.prop_table = props[start:start + count]
+        node.prop_map = {prop.name_hash: prop for prop in node.prop_table}
+        start += count
+
+
+def rtpc_node_children_from_binary(buf, node, lazy=False, strings: Optional[RtpcStringTable] = None):
     # read children
+    p = rtpc_node_children_offset(node)
     node.child_table = []
+    node.child_map = {}
     for i in range(node.child_count):
         child = RtpcNode()
-        rtpc_node_from_binary(f, child)
+        p = rtpc_node_from_binary(buf, p, child, lazy=lazy, strings=strings)
         node.child_table.append(child)
         node.child_map[child.name_hash] = child
 
-    f.seek(old_p)
-
 
-def rtpc_from_binary(f_raw, rtpc: Optional[Rtpc] = None):
+def rtpc_node_headers_from_binary(buf, node, nodes):
+    """
+    Read the headers of the whole subtree under node, collecting every node in nodes. Uses an explicit stack rather
+    than recursion, and visits nodes depth first in child order, which is the order the data is laid out in the file.
+    """
+    stack = [node]
+    while stack:
+        parent = stack.pop()
+        nodes.append(parent)
+        p = rtpc_node_children_offset(parent)
+        parent.child_table = []
+        parent.child_map = {}
+        for i in range(parent.child_count):
+            child = RtpcNode()
+            p = rtpc_node_header_from_binary(buf, p, child)
+            parent.child_table.append(child)
+            parent.child_map[child.name_hash] = child
+        stack.extend(reversed(parent.child_table))
+
+
+k_fingerprint_size = 16
+
+
+def rtpc_prop_fingerprint_bytes(prop_type, value):
+    """
+    Canonical bytes of a decoded property value. Offsets are never included, so a value that moves between two
+    versions of a file still has the same bytes.
+    """
+    if prop_type == k_type_f32:
+        return _f32.pack(value)
+    elif prop_type == k_type_str:
+        if value is None:
+            return b''
+        return value.encode('utf-8') if isinstance(value, str) else value
+    elif prop_type in _prop_f32_counts:
+        return struct.pack('<{}f'.format(len(value)), *value)
+    elif prop_type in _prop_array_codes or prop_type == k_type_event:
+        return _u32.pack(len(value)) + bytes(value)
+    elif prop_type == k_type_objid:
+        return _u64.pack(value)
+    else:
+        return _u32.pack(value)
+
+
+def rtpc_fingerprint_digest(node, child_fingerprints):
+    # fingerprint of node given those of its children, in order
+    h = hashlib.blake2b(_u32.pack(node.name_hash), digest_size=k_fingerprint_size)
+    for prop in node.prop_table:
+        data = rtpc_prop_fingerprint_bytes(prop.type, prop.data)
+        h.update(_prop_header.pack(prop.name_hash, len(data), prop.type))
+        h.update(data)
+    for fingerprint in child_fingerprints:
+        h.update(fingerprint)
+    return h.digest()
+
+
+def rtpc_nodes_fingerprint(nodes):
+    """
+    Compute the fingerprint of each node in nodes, which must list every child after its parent (see
+    rtpc_node_headers_from_binary) and hold on to its child nodes, as an eagerly decoded tree does. A fingerprint
+    covers the node's name, its properties and the fingerprints of its children in order, so two subtrees with equal
+    fingerprints hold equal data.
+    """
+    for node in reversed(nodes):
+        node.fingerprint = rtpc_fingerprint_digest(node, [child.fingerprint for child in node.child_table])
+
+
+def rtpc_node_fingerprint(node):
+    """
+    Fingerprint of node (see rtpc_nodes_fingerprint), computing it for the subtree when missing. The subtree is walked
+    once in post-order, keeping the child fingerprints on its own stack, so it also works on lazy trees whose nodes
+    are decoded again on each access and so do not keep their fingerprint (see deca.ff_rtpc_lru).
+    """
+    if node.fingerprint is not None:
+        return node.fingerprint
+
+    # (node, its children, fingerprints of the children done so far)
+    stack = [(node, node.child_table, [])]
+    while stack:
+        parent, children, done = stack[-1]
+        if len(done) < len(children):
+            child = children[len(done)]
+            if child.fingerprint is None:
+                stack.append((child, child.child_table, []))
+            else:
+                done.append(child.fingerprint)
+            continue
+        stack.pop()
+        parent.fingerprint = rtpc_fingerprint_digest(parent, done)
+        if stack:
+            stack[-1][2].append(parent.fingerprint)
+    return node.fingerprint
+
+
+def rtpc_node_from_binary(
+        buf, pos, node, lazy=False, strings: Optional[RtpcStringTable] = None, fingerprint=False, subtree_cache=None):
+    pos = rtpc_node_header_from_binary(buf, pos, node)
+
+    if lazy:
+        node._buf = buf
+        node._strings = strings
+        node._cache = subtree_cache
+        node.prop_table = None
+        node.prop_map = None
+        node.child_table = None
+        node.child_map = None
+    else:
+        nodes = []
+        rtpc_node_headers_from_binary(buf, node, nodes)
+        rtpc_nodes_props_from_binary(buf, nodes, strings)
+        if fingerprint:
+            rtpc_nodes_fingerprint(nodes)
+
+    return pos
+
+
+def rtpc_iter_nodes(node, breadth_first=False):
+    """
+    Iterate over node and every node below it, yielding (depth, node). Depth first iteration is pre-order, in child
+    order; breadth first iteration yields level by level. Neither recurses, so tree depth is not limited.
+    """
+    pending = collections.deque([(0, node)])
+    pop = pending.popleft if breadth_first else pending.pop
+    while pending:
+        depth, node = pop()
+        yield depth, node
+        children = node.child_table
+        if breadth_first:
+            pending.extend((depth + 1, child) for child in children)
+        else:
+            pending.extend((depth + 1, child) for child in reversed(children))
+
+
+def rtpc_events_from_binary(f_raw, intern_strings=False, decode_strings=False):
+    """
+    Stream an RTPC file as events without building RtpcNode/RtpcProperty objects. Yields, in file order:
+        (k_event_enter_node, (name_hash, data_offset, prop_count, child_count))
+        (k_event_prop, name_hash, type, value) for each of the node's properties
+        ... the events of each child node ...
+        (k_event_exit_node, (name_hash, data_offset, prop_count, child_count))
+    Memory use is bounded by the depth of the tree, plus the string table (see RtpcStringTable).
+    """
+    buf = rtpc_buffer(f_raw)
+    strings = RtpcStringTable(buf, intern=intern_strings, decode=decode_strings)
+
+    magic = bytes(buf[0:4])
+    if magic != b'RTPC':
+        raise EDecaIncorrectFileFormat('Bad MAGIC {}'.format(magic))
+
+    # per open node: [header, position of next child header, children left]
+    stack = []
+    pos = 8
+    while True:
+        if pos is not None:
+            try:
+                header = _node_header.unpack_from(buf, pos)
+            except struct.error as e:
+                raise _truncated(e) from e
+            yield k_event_enter_node, header
+
+            name_hash, data_offset, prop_count, child_count = header
+            p = data_offset
+            for i in range(prop_count):
+                try:
+                    prop_hash, data_raw, prop_type = _prop_header.unpack_from(buf, p)
+                    value = rtpc_prop_value_from_binary(buf, p, data_raw, prop_type, strings)
+                except struct.error as e:
+                    raise _truncated(e) from e
+                yield k_event_prop, prop_hash, prop_type, value
+                p += _prop_header.size
+
+            p = p + (4 - (p % 4)) % 4
+            stack.append([header, p, child_count])
+
+        top = stack[-1]
+        if top[2] == 0:
+            stack.pop()
+            yield k_event_exit_node, top[0]
+            if not stack:
+                break
+            pos = None
+        else:
+            pos = top[1]
+            top[1] += _node_header.size
+            top[2] -= 1
+
+
+def rtpc_from_binary(
+        f_raw, rtpc: Optional[Rtpc] = None, lazy=False, intern_strings=False, decode_strings=False, fingerprint=False,
+        subtree_cache=None):
+    """
+    Decode an RTPC file. f_raw may be a path, bytes, an mmap or an open binary file. With lazy=True only the root
+    header is decoded here, the rest of the tree is decoded node by node as it is accessed. String values go through
+    rtpc.strings, see RtpcStringTable for intern_strings and decode_strings. With fingerprint=True every node's
+    fingerprint is computed as the tree is decoded (eager decoding only, see rtpc_node_fingerprint). Passing a
+    subtree_cache (see deca.ff_rtpc_lru) implies lazy=True and keeps the decoded parts of the tree in that bounded
+    cache instead of in the nodes.
+    """
     if rtpc is None:
         rtpc = Rtpc()
 
-    f = ArchiveFile(f_raw)
+    buf = rtpc_buffer(f_raw)
 
-    rtpc.magic = f.read_strl(4)
+    rtpc.magic = bytes(buf[0:4])
     if rtpc.magic != b'RTPC':
-        raise Exception('Bad MAGIC {}'.format(rtpc.magic))
+        raise EDecaIncorrectFileFormat('Bad MAGIC {}'.format(rtpc.magic))
+
+    rtpc.strings = RtpcStringTable(buf, intern=intern_strings, decode=decode_strings)
 
-    rtpc.version = f.read_u32()
+    try:
+        rtpc.version = _u32.unpack_from(buf, 4)[0]
 
-    rtpc.root_node = RtpcNode()
-    rtpc_node_from_binary(f, rtpc.root_node)
+        rtpc.root_node = RtpcNode()
+        rtpc_node_from_binary(
+            buf, 8, rtpc.root_node, lazy=lazy or subtree_cache is not None, strings=rtpc.strings,
+            fingerprint=fingerprint, subtree_cache=subtree_cache)
+    except struct.error as e:
+        raise _truncated(e) from e
 
     return rtpc
@@ -0,0 +1,281 @@
+from deca.ff_rtpc import *
+from deca.ff_rtpc import _prop_array_codes, _prop_f32_counts, _u64
+from deca.ff_rtpc_columns import RtpcColumns, rtpc_columns_from_binary, rtpc_from_columns
+import bisect
+import hashlib
+import json
+import zipfile
+from pathlib import Path
+from collections.abc import Mapping
+from typing import Optional, Union
+
+
+k_snapshot_magic = b'RTPCSNAP'
+k_snapshot_version = 2
+
+# magic, snapshot format version, source size, source blake2b digest
+_snapshot_header = struct.Struct('<8sIQ32s')
+
+# the RtpcColumns arrays stored as is in a snapshot
+_snapshot_arrays = (
+    'node_parent', 'node_depth', 'node_name_hash', 'node_data_offset', 'node_prop_count', 'node_child_count',
+    'node_prop_start', 'prop_node', 'prop_index', 'prop_name_hash', 'prop_type', 'prop_u32', 'prop_pos',
+)
+
+# how a payload's bytes are to be read back, beyond what its property type says
+k_payload_raw = 0
+k_payload_none = 1
+k_payload_str = 2
+
+
+def _payload_to_bytes(prop_type, value):
+    # (flag, bytes) of a payload, see _payload_from_bytes
+    if value is None:
+        return k_payload_none, b''
+    elif isinstance(value, str):
+        return k_payload_str, value.encode('utf-8')
+    elif prop_type == k_type_str:
+        return k_payload_raw, bytes(value)
+    elif prop_type in _prop_f32_counts:
+        return k_payload_raw, struct.pack('<{}f'.format(len(value)), *value)
+    elif prop_type == k_type_objid:
+        return k_payload_raw, _u64.pack(value)
+    else:
+        value = array.array(value.typecode, value)
+        if sys.byteorder != 'little':
+            value.byteswap()
+        return k_payload_raw, value.tobytes()
+
+
+def _payload_from_bytes(prop_type, flag, data):
+    if flag == k_payload_none:
+        return None
+    elif flag == k_payload_str:
+        return data.decode('utf-8')
+    elif prop_type == k_type_str:
+        return data
+    elif prop_type in _prop_f32_counts:
+        return list(struct.unpack('<{}f'.format(len(data) // 4), data))
+    elif prop_type == k_type_objid:
+        return _u64.unpack(data)[0]
+    elif prop_type in _prop_array_codes or prop_type == k_type_event:
+        typecode = _prop_array_codes.get(prop_type, 'Q')
+        return rtpc_array_from_binary(data, 0, typecode, len(data) // array.array(typecode).itemsize)
+    raise EDecaErrorParse('Bad snapshot payload type {}'.format(prop_type))
+
+
+def rtpc_columns_to_arrays(columns: RtpcColumns) -> dict:
+    """
+    Plain NumPy arrays holding everything in columns, payloads included, so they can be saved without pickling.
+    """
+    arrays = {name: getattr(columns, name) for name in _snapshot_arrays}
+    arrays['magic'] = np.frombuffer(columns.magic, dtype=np.uint8)
+    arrays['version'] = np.array(columns.version, dtype=np.uint32)
+
+    # payload type is that of the first property using the offset, as when decoding
+    is_offset = columns.prop_is_offset
+    offsets, first = np.unique(columns.prop_u32[is_offset], return_index=True)
+    types = columns.prop_type[is_offset][first]
+    flags = []
+    blobs = []
+    for offset, prop_type in zip(offsets.tolist(), types.tolist()):
+        flag, data = _payload_to_bytes(prop_type, columns.payloads[offset])
+        flags.append(flag)
+        blobs.append(data)
+    arrays['payload_offset'] = offsets.astype(np.uint32)
+    arrays['payload_type'] = types.astype(np.uint8)
+    arrays['payload_flag'] = np.array(flags, dtype=np.uint8)
+    arrays['payload_end'] = np.cumsum([len(b) for b in blobs], dtype=np.int64)
+    arrays['payload_bytes'] = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+    return arrays
+
+
+def rtpc_columns_from_arrays(arrays, columns: Optional[RtpcColumns] = None) -> RtpcColumns:
+    """
+    Inverse of rtpc_columns_to_arrays, arrays is a mapping such as the NpzFile returned by np.load.
+    """
+    if columns is None:
+        columns = RtpcColumns()
+    for name in _snapshot_arrays:
+        setattr(columns, name, arrays[name])
+    columns.magic = arrays['magic'].tobytes()
+    columns.version = int(arrays['version'])
+
+    columns.payloads = RtpcSnapshotPayloads(
+        arrays['payload_offset'], arrays['payload_type'], arrays['payload_flag'], arrays['payload_end'],
+        arrays['payload_bytes'].tobytes())
+    return columns
+
+
+class RtpcSnapshotPayloads(Mapping):
+    """
+    The payloads dict of columns loaded from a snapshot, offset to value. Each payload is decoded from the snapshot
+    bytes on first lookup and kept, so loading a snapshot costs nothing per payload.
+    """
+    def __init__(self, offsets, types, flags, ends, blob: bytes):
+        self.offsets = offsets
+        self.types = types
+        self.flags = flags
+        self.ends = ends
+        self.blob = blob
+        self._index = None
+        self._values = {}
+
+    def __getitem__(self, offset):
+        try:
+            return self._values[offset]
+        except KeyError:
+            pass
+        if self._index is None:
+            # converted on the first lookup, payloads are found by bisecting the sorted offsets
+            self._index = (self.offsets.tolist(), self.types.tolist(), self.flags.tolist(), [0] + self.ends.tolist())
+        offsets, types, flags, ends = self._index
+        i = bisect.bisect_left(offsets, offset)
+        if i == len(offsets) or offsets[i] != offset:
+            raise KeyError(offset)
+        value = _payload_from_bytes(types[i], flags[i], self.blob[ends[i]:ends[i + 1]])
+        self._values[offset] = value
+        return value
+
+    def __iter__(self):
+        return iter(self.offsets.tolist())
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+def rtpc_cache_dir_default() -> Path:
+    env = os.environ.get('DECA_RTPC_CACHE')
+    if env:
+        return Path(env)
+    return Path.home() / '.cache' / 'deca' / 'rtpc'
+
+
+def rtpc_content_digest(buf) -> bytes:
+    return hashlib.blake2b(buf, digest_size=32).digest()
+
+
+class RtpcCache:
+    """
+    On disk cache of decoded RTPC files. Each snapshot is the file's columnar form (see deca.ff_rtpc_columns) saved as
+    an .npz of plain arrays (see rtpc_columns_to_arrays), which is loaded without unpickling anything, and is named by
+    the blake2b digest of the source content. A per directory index remembers the size, mtime and digest last seen
+    for each source path, so unchanged files are not re-hashed; when size or mtime differ the content is hashed again
+    and the digest decides. Snapshots that fail to validate are deleted and rebuilt. After each write the least
+    recently used snapshots are evicted until the directory fits in max_bytes.
+    """
+    def __init__(self, cache_dir: Union[str, os.PathLike, None] = None, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else rtpc_cache_dir_default()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def index_path(self) -> Path:
+        return self.cache_dir / 'index.json'
+
+    def snapshot_path(self, digest: bytes) -> Path:
+        return self.cache_dir / '{}.rtpcs'.format(digest.hex())
+
+    def _load_index(self) -> dict:
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index: dict):
+        tmp = self.index_path.with_suffix('.tmp{}'.format(os.getpid()))
+        tmp.write_text(json.dumps(index))
+        os.replace(tmp, self.index_path)
+
+    def _digest(self, path: Path, buf) -> bytes:
+        st = path.stat()
+        key = str(path.resolve())
+        index = self._load_index()
+        entry = index.get(key)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return bytes.fromhex(entry[2])
+        digest = rtpc_content_digest(buf)
+        index[key] = [st.st_size, st.st_mtime_ns, digest.hex()]
+        self._save_index(index)
+        return digest
+
+    def _read_snapshot(self, snapshot: Path, size: int, digest: bytes) -> Optional[RtpcColumns]:
+        try:
+            with np.load(snapshot, allow_pickle=False) as arrays:
+                magic, version, snap_size, snap_digest = _snapshot_header.unpack(arrays['header'].tobytes())
+                if magic != k_snapshot_magic or version != k_snapshot_version or \
+                        snap_size != size or snap_digest != digest:
+                    raise ValueError('stale snapshot')
+                columns = rtpc_columns_from_arrays(arrays)
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, EOFError, struct.error, zipfile.BadZipFile, EDecaErrorParse, EDecaOutOfData):
+            # stale, truncated or not a snapshot at all (np.load refuses pickles), rebuild it
+            snapshot.unlink(missing_ok=True)
+            return None
+
+        # touch for LRU eviction
+        os.utime(snapshot)
+        return columns
+
+    def _write_snapshot(self, snapshot: Path, size: int, digest: bytes, columns: RtpcColumns):
+        tmp = snapshot.with_suffix('.tmp{}'.format(os.getpid()))
+        header = _snapshot_header.pack(k_snapshot_magic, k_snapshot_version, size, digest)
+        with open(tmp, 'wb') as f:
+            np.savez(f, allow_pickle=False, header=np.frombuffer(header, dtype=np.uint8), **rtpc_columns_to_arrays(columns))
+        os.replace(tmp, snapshot)
+
+    def evict(self):
+        snapshots = []
+        total = 0
+        for snapshot in self.cache_dir.glob('*.rtpcs'):
+            try:
+                st = snapshot.stat()
+            except FileNotFoundError:
+                continue
+            snapshots.append((st.st_mtime_ns, st.st_size, snapshot))
+            total += st.st_size
+        snapshots.sort()
+        while snapshots and total > self.max_bytes:
+            mtime, size, snapshot = snapshots.pop(0)
+            snapshot.unlink(missing_ok=True)
+            total -= size
+
+    def columns(self, path: Union[str, os.PathLike]) -> RtpcColumns:
+        """
+        Columnar form of the RTPC file at path, from the cache when a valid snapshot exists.
+        """
+        path = Path(path)
+        buf = rtpc_buffer(path)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        digest = self._digest(path, buf)
+        snapshot = self.snapshot_path(digest)
+
+        columns = self._read_snapshot(snapshot, len(buf), digest)
+        if columns is not None:
+            self.hits += 1
+            return columns
+
+        self.misses += 1
+        columns = rtpc_columns_from_binary(buf)
+        self._write_snapshot(snapshot, len(buf), digest, columns)
+        self.evict()
+        return columns
+
+    def load(self, path: Union[str, os.PathLike], rtpc: Optional[Rtpc] = None, lazy=True) -> Rtpc:
+        """
+        Decoded tree of the RTPC file at path. With lazy=True (the default) nodes are built from the columns as they
+        are accessed, see rtpc_from_columns.
+        """
+        return rtpc_from_columns(self.columns(path), rtpc, lazy=lazy)
+
+
+def rtpc_from_binary_cached(
+        path: Union[str, os.PathLike], rtpc: Optional[Rtpc] = None, cache: Optional[RtpcCache] = None, lazy=True):
+    """
+    rtpc_from_binary for a file path, through an on disk snapshot cache (see RtpcCache).
+    """
+    if cache is None:
+        cache = RtpcCache()
+    return cache.load(path, rtpc, lazy=lazy)
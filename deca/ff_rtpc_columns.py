@@ -0,0 +1,319 @@
+from deca.ff_rtpc import *
+from deca.ff_rtpc import _node_header, _prop_header, _prop_header_bytes, _prop_is_known, _prop_is_offset, _prop_offset_types
+import array
+import numpy as np
+from typing import List
+
+
+class RtpcColumns:
+    """
+    An RTPC tree flattened into parallel arrays. Nodes are numbered in depth first, child order, the root is node 0
+    and has parent -1. Properties of all nodes are concatenated in the same node order. Values of offset based
+    properties (strings, vectors, arrays, ...) are kept once per payload offset in payloads, keyed by prop_u32.
+    """
+    def __init__(self):
+        self.magic = None
+        self.version = None
+
+        self.node_parent = None
+        self.node_depth = None
+        self.node_name_hash = None
+        self.node_data_offset = None
+        self.node_prop_count = None
+        self.node_child_count = None
+        self.node_prop_start = None
+
+        self.prop_node = None
+        self.prop_index = None
+        self.prop_name_hash = None
+        self.prop_type = None
+        self.prop_u32 = None
+        self.prop_pos = None
+
+        self.payloads = {}
+
+    def __len__(self):
+        return len(self.node_parent)
+
+    @property
+    def prop_f32(self):
+        # inline f32 values, only meaningful where prop_type == k_type_f32
+        return self.prop_u32.view(np.float32)
+
+    @property
+    def prop_is_offset(self):
+        return _prop_is_offset[self.prop_type]
+
+    def prop_value(self, i):
+        prop_type = self.prop_type[i]
+        if prop_type == k_type_f32:
+            return float(self.prop_f32[i])
+        elif _prop_is_offset[prop_type]:
+            return self.payloads[int(self.prop_u32[i])]
+        else:
+            return int(self.prop_u32[i])
+
+    def node_props(self, node_id):
+        # slice of the prop arrays holding the properties of node_id
+        start = int(self.node_prop_start[node_id])
+        return slice(start, start + int(self.node_prop_count[node_id]))
+
+
+def rtpc_columns_from_buffer(buf, pos=8, columns: Optional[RtpcColumns] = None):
+    """
+    Flatten the subtree whose node header is at pos directly from a buffer (see rtpc_buffer), without building
+    RtpcNode objects. All arrays are copies, the result does not reference buf.
+    """
+    if columns is None:
+        columns = RtpcColumns()
+
+    parents = []
+    depths = []
+    headers = []
+    stack = [(pos, -1, 0)]
+    while stack:
+        p, parent, depth = stack.pop()
+        node_id = len(headers)
+        header = _node_header.unpack_from(buf, p)
+        headers.append(header)
+        parents.append(parent)
+        depths.append(depth)
+
+        name_hash, data_offset, prop_count, child_count = header
+        p = data_offset + prop_count * _prop_header.size
+        p = p + (4 - (p % 4)) % 4
+        stack.extend((p + i * _node_header.size, node_id, depth + 1) for i in reversed(range(child_count)))
+
+    headers = np.array(headers, dtype=np.int64).reshape(-1, 4)
+    columns.node_parent = np.array(parents, dtype=np.int32)
+    columns.node_depth = np.array(depths, dtype=np.int32)
+    columns.node_name_hash = headers[:, 0].astype(np.uint32)
+    columns.node_data_offset = headers[:, 1].astype(np.uint32)
+    columns.node_prop_count = headers[:, 2].astype(np.uint16)
+    columns.node_child_count = headers[:, 3].astype(np.uint16)
+    columns.node_prop_start = (np.cumsum(headers[:, 2]) - headers[:, 2]).astype(np.int64)
+
+    positions = rtpc_prop_positions(headers[:, 1], headers[:, 2])
+    raw = np.frombuffer(buf, dtype=np.uint8)
+    rtpc_check_positions(len(raw), positions, _prop_header.size)
+    records = raw[positions[:, None] + _prop_header_bytes].view(prop_header_dtype)[:, 0]
+
+    counts = headers[:, 2]
+    columns.prop_node = np.repeat(np.arange(len(headers), dtype=np.int32), counts)
+    columns.prop_index = (np.arange(len(positions)) - np.repeat(columns.node_prop_start, counts)).astype(np.uint16)
+    columns.prop_name_hash = records['name_hash'].copy()
+    columns.prop_type = records['type'].copy()
+    columns.prop_u32 = records['data_raw'].copy()
+    columns.prop_pos = positions
+
+    if not _prop_is_known[columns.prop_type].all():
+        raise EDecaErrorParse('NOT HANDLED {}'.format(columns.prop_type[~_prop_is_known[columns.prop_type]][0]))
+
+    is_offset = _prop_is_offset[columns.prop_type]
+    offsets, first = np.unique(columns.prop_u32[is_offset], return_index=True)
+    types = columns.prop_type[is_offset][first]
+    columns.payloads = {
+        offset: rtpc_prop_value_from_binary(buf, None, offset, prop_type)
+        for offset, prop_type in zip(offsets.tolist(), types.tolist())
+    }
+
+    return columns
+
+
+def rtpc_columns_from_binary(f_raw, columns: Optional[RtpcColumns] = None):
+    """
+    Flatten a whole RTPC file, f_raw is anything rtpc_from_binary accepts.
+    """
+    buf = rtpc_buffer(f_raw)
+
+    magic = bytes(buf[0:4])
+    if magic != b'RTPC':
+        raise EDecaIncorrectFileFormat('Bad MAGIC {}'.format(magic))
+
+    try:
+        columns = rtpc_columns_from_buffer(buf, 8, columns)
+        columns.magic = magic
+        columns.version = struct.unpack_from('<I', buf, 4)[0]
+    except struct.error as e:
+        raise EDecaOutOfData('RTPC data truncated: {}'.format(e)) from e
+
+    return columns
+
+
+def rtpc_columns_from_rtpc(rtpc: Rtpc, columns: Optional[RtpcColumns] = None):
+    """
+    Flatten an already decoded (eager or lazy) tree.
+    """
+    if columns is None:
+        columns = RtpcColumns()
+    columns.magic = rtpc.magic
+    columns.version = rtpc.version
+
+    ids = {}
+    nodes = []
+    parents = []
+    depths = []
+    for depth, node in rtpc_iter_nodes(rtpc.root_node):
+        ids[id(node)] = len(nodes)
+        nodes.append(node)
+        depths.append(depth)
+        parents.append(-1)
+    for node_id, node in enumerate(nodes):
+        for child in node.child_table:
+            parents[ids[id(child)]] = node_id
+
+    columns.node_parent = np.array(parents, dtype=np.int32)
+    columns.node_depth = np.array(depths, dtype=np.int32)
+    columns.node_name_hash = np.array([n.name_hash for n in nodes], dtype=np.uint32)
+    columns.node_data_offset = np.array([n.data_offset for n in nodes], dtype=np.uint32)
+    columns.node_prop_count = np.array([n.prop_count for n in nodes], dtype=np.uint16)
+    columns.node_child_count = np.array([n.child_count for n in nodes], dtype=np.uint16)
+    counts = columns.node_prop_count.astype(np.int64)
+    columns.node_prop_start = np.cumsum(counts) - counts
+
+    props = [prop for node in nodes for prop in node.prop_table]
+    columns.prop_node = np.repeat(np.arange(len(nodes), dtype=np.int32), counts)
+    columns.prop_index = (np.arange(len(props)) - np.repeat(columns.node_prop_start, counts)).astype(np.uint16)
+    columns.prop_name_hash = np.array([p.name_hash for p in props], dtype=np.uint32)
+    columns.prop_type = np.array([p.type for p in props], dtype=np.uint8)
+    columns.prop_u32 = np.array([p.data_raw for p in props], dtype=np.uint32)
+    columns.prop_pos = np.array([p.pos for p in props], dtype=np.int64)
+    columns.payloads = {p.data_raw: p.data for p in props if p.type in _prop_offset_types}
+
+    return columns
+
+
+def _prop_rows(columns: RtpcColumns):
+    # one (pos, name_hash, data_raw, type) row per property, and data_raw of each read as an f32
+    rows = np.stack([columns.prop_pos, columns.prop_name_hash, columns.prop_u32, columns.prop_type], axis=1)
+    return rows.astype(np.int64, copy=False), columns.prop_f32
+
+
+def _props_from_rows(payloads, rows, f32s) -> List[RtpcProperty]:
+    props = []
+    for (pos, name_hash, data_raw, prop_type), value in zip(rows, f32s):
+        prop = RtpcProperty()
+        prop.pos = pos
+        prop.name_hash = name_hash
+        prop.data_raw = data_raw
+        prop.type = prop_type
+        if prop_type in _prop_offset_types:
+            prop.data_pos = data_raw
+            prop.data = payloads[data_raw]
+            if isinstance(prop.data, (list, array.array)):
+                # payloads are shared by offset, give each property its own copy as the decoder does
+                prop.data = prop.data[:]
+        else:
+            prop.data_pos = pos + 4
+            prop.data = value if prop_type == k_type_f32 else data_raw
+        props.append(prop)
+    return props
+
+
+def rtpc_props_from_columns(columns: RtpcColumns, start=0, stop=None) -> List[RtpcProperty]:
+    """
+    RtpcProperty objects for the properties start:stop of columns, decoded as rtpc_from_binary would.
+    """
+    rows, f32s = _prop_rows(columns)
+    return _props_from_rows(columns.payloads, rows[start:stop].tolist(), f32s[start:stop].tolist())
+
+
+def rtpc_node_from_columns(columns: RtpcColumns) -> Optional[RtpcNode]:
+    """
+    Rebuild the eagerly decoded (sub)tree held in columns, returning its root node.
+    """
+    props = rtpc_props_from_columns(columns)
+
+    nodes = []
+    start = 0
+    for parent, name_hash, data_offset, prop_count, child_count in zip(
+            columns.node_parent.tolist(), columns.node_name_hash.tolist(), columns.node_data_offset.tolist(),
+            columns.node_prop_count.tolist(), columns.node_child_count.tolist()):
+        node = RtpcNode()
+        node.name_hash = name_hash
+        node.data_offset = data_offset
+        node.prop_count = prop_count
+        node.child_count = child_count
+        node.prop_table = props[start:start + prop_count]
+        node.prop_map = {prop.name_hash: prop for prop in node.prop_table}
+        start += prop_count
+        if parent >= 0:
+            parent_node = nodes[parent]
+            parent_node.child_table.append(node)
+            parent_node.child_map[name_hash] = node
+        nodes.append(node)
+
+    return nodes[0] if nodes else None
+
+
+class RtpcColumnsSource:
+    """
+    Builds the nodes of a lazy tree over columns (see rtpc_from_columns(lazy=True)). Each node's properties and
+    children are made from its slices of the columns on first access and then kept in the node, like a lazy node
+    decoded from a buffer. Nodes find their slices by data_offset.
+    """
+    def __init__(self, columns: RtpcColumns):
+        self.columns = columns
+        counts = columns.node_child_count.astype(np.int64)
+        self.node_child_start = (np.cumsum(counts) - counts).tolist()
+        self.node_child_ids = (np.argsort(columns.node_parent[1:], kind='stable') + 1).tolist()
+        self.node_prop_start = columns.node_prop_start.tolist()
+        self._node_lists = (
+            columns.node_name_hash.tolist(), columns.node_data_offset.tolist(), columns.node_prop_count.tolist(),
+            columns.node_child_count.tolist())
+        # stacked on the first property access, so each node's properties are one slice
+        self._prop_rows = None
+        self._ids = {}
+
+    def node(self, node_id: int) -> Optional[RtpcNode]:
+        return self._nodes([node_id])[0] if len(self.columns) else None
+
+    def _nodes(self, ids) -> List[RtpcNode]:
+        name_hashes, data_offsets, prop_counts, child_counts = self._node_lists
+        nodes = []
+        for node_id in ids:
+            node = RtpcNode()
+            node.name_hash = name_hashes[node_id]
+            node.data_offset = data_offsets[node_id]
+            node.prop_count = prop_counts[node_id]
+            node.child_count = child_counts[node_id]
+            node.prop_table = None
+            node.prop_map = None
+            node.child_table = None
+            node.child_map = None
+            node._cache = self
+            self._ids[node.data_offset] = node_id
+            nodes.append(node)
+        return nodes
+
+    def props(self, node: RtpcNode):
+        if self._prop_rows is None:
+            self._prop_rows = _prop_rows(self.columns)
+        rows, f32s = self._prop_rows
+        start = self.node_prop_start[self._ids[node.data_offset]]
+        stop = start + node.prop_count
+        node.prop_table = _props_from_rows(self.columns.payloads, rows[start:stop].tolist(), f32s[start:stop].tolist())
+        node.prop_map = {prop.name_hash: prop for prop in node.prop_table}
+        return node.prop_table, node.prop_map
+
+    def children(self, node: RtpcNode):
+        start = self.node_child_start[self._ids[node.data_offset]]
+        node.child_table = self._nodes(self.node_child_ids[start:start + node.child_count])
+        node.child_map = {child.name_hash: child for child in node.child_table}
+        return node.child_table, node.child_map
+
+
+def rtpc_from_columns(columns: RtpcColumns, rtpc: Optional[Rtpc] = None, lazy=False):
+    """
+    Rebuild a decoded tree from its columns, the inverse of rtpc_columns_from_rtpc. With lazy=True only the root node
+    is made here, the rest of the tree as it is accessed (see RtpcColumnsSource).
+    """
+    if rtpc is None:
+        rtpc = Rtpc()
+    rtpc.magic = columns.magic
+    rtpc.version = columns.version
+    if lazy:
+        rtpc.root_node = RtpcColumnsSource(columns).node(0)
+    else:
+        rtpc.root_node = rtpc_node_from_columns(columns)
+    return rtpc
@@ -0,0 +1,263 @@
+from deca.ff_rtpc import *
+from deca.ff_rtpc import _prop_offset_types
+from deca.ff_rtpc_columns import RtpcColumns, rtpc_columns_from_binary
+from collections.abc import Mapping
+from typing import Dict, List, Optional
+import functools
+import numpy as np
+
+
+class RtpcCompactTree:
+    """
+    A whole RTPC tree held only in the typed arrays of its columns (see deca.ff_rtpc_columns). Nodes and properties
+    are handed out as RtpcCompactNode/RtpcCompactProperty proxies, created on access and holding nothing but an index,
+    so the memory used is the arrays plus one decoded value per payload offset. Values are shared between properties
+    with the same payload and must not be modified.
+    """
+    def __init__(self, columns: RtpcColumns):
+        self.columns = columns
+
+        # children of each node as one index array: node_child_ids[node_child_start[i]:][:child_count[i]]
+        counts = columns.node_child_count.astype(np.int64)
+        self.node_child_start = np.cumsum(counts) - counts
+        self.node_child_ids = np.argsort(columns.node_parent[1:], kind='stable').astype(np.int32) + 1
+
+        self.fingerprints: Dict[int, bytes] = {}
+
+        # (hashes, ids) sorted by name_hash within each node's slice, built on the first prop_map/child_map lookup
+        self._prop_lookup = None
+        self._child_lookup = None
+        self._child_name_hashes = None
+
+    def __len__(self):
+        return len(self.columns)
+
+    @property
+    def root_node(self) -> Optional['RtpcCompactNode']:
+        return RtpcCompactNode(self, 0) if len(self.columns) else None
+
+    def node_children(self, node_id) -> List[int]:
+        start = int(self.node_child_start[node_id])
+        return self.node_child_ids[start:start + int(self.columns.node_child_count[node_id])].tolist()
+
+    @staticmethod
+    def _lookup(group, hashes, ids):
+        # ids ordered by group, then hash, then position, with their hashes; groups keep their slices
+        order = np.lexsort((np.arange(len(ids)), hashes, group))
+        return hashes[order], ids[order]
+
+    def prop_lookup(self):
+        if self._prop_lookup is None:
+            columns = self.columns
+            ids = np.arange(len(columns.prop_node), dtype=np.int32)
+            self._prop_lookup = self._lookup(columns.prop_node, columns.prop_name_hash, ids)
+        return self._prop_lookup
+
+    def child_name_hashes(self):
+        # name_hash of each entry of node_child_ids
+        if self._child_name_hashes is None:
+            self._child_name_hashes = self.columns.node_name_hash[self.node_child_ids]
+        return self._child_name_hashes
+
+    def child_lookup(self):
+        if self._child_lookup is None:
+            columns = self.columns
+            ids = self.node_child_ids
+            self._child_lookup = self._lookup(columns.node_parent[ids], self.child_name_hashes(), ids)
+        return self._child_lookup
+
+    def nbytes(self):
+        # size of the arrays, the decoded payloads are not included
+        arrays = [v for v in vars(self.columns).values() if isinstance(v, np.ndarray)]
+        arrays += [self.node_child_start, self.node_child_ids]
+        for lookup in (self._prop_lookup, self._child_lookup):
+            if lookup is not None:
+                arrays += lookup
+        if self._child_name_hashes is not None:
+            arrays.append(self._child_name_hashes)
+        return sum(a.nbytes for a in arrays)
+
+
+class RtpcCompactProperty:
+    """
+    Read only stand in for an RtpcProperty of a RtpcCompactTree.
+    """
+    __slots__ = ('_tree', '_id')
+
+    def __init__(self, tree: RtpcCompactTree, prop_id: int):
+        self._tree = tree
+        self._id = prop_id
+
+    @property
+    def pos(self):
+        return int(self._tree.columns.prop_pos[self._id])
+
+    @property
+    def name_hash(self):
+        return int(self._tree.columns.prop_name_hash[self._id])
+
+    @property
+    def data_raw(self):
+        return int(self._tree.columns.prop_u32[self._id])
+
+    @property
+    def type(self):
+        return int(self._tree.columns.prop_type[self._id])
+
+    @property
+    def data_pos(self):
+        if self.type in _prop_offset_types:
+            return self.data_raw
+        return self.pos + 4
+
+    @property
+    def data(self):
+        return self._tree.columns.prop_value(self._id)
+
+    def __eq__(self, other):
+        return isinstance(other, RtpcCompactProperty) and self._tree is other._tree and self._id == other._id
+
+    def __hash__(self):
+        return hash((id(self._tree), self._id))
+
+    def __repr__(self):
+        return RtpcProperty.__repr__(self)
+
+
+class RtpcCompactMap(Mapping):
+    """
+    prop_map/child_map of a RtpcCompactNode: a binary search in the node's slice [start:stop] of the tree's sorted
+    lookup arrays (see RtpcCompactTree.prop_lookup) instead of building a dict. Like a dict built from the table, the
+    last entry wins when a name_hash repeats, and iteration is in table order.
+    """
+    __slots__ = ('_lookup', '_table_hashes', '_start', '_stop', '_make')
+
+    def __init__(self, lookup, table_hashes: np.ndarray, start: int, stop: int, make):
+        self._lookup = lookup
+        self._table_hashes = table_hashes
+        self._start = start
+        self._stop = stop
+        self._make = make
+
+    def _find(self, key):
+        # index of key in the sorted lookup arrays, or -1
+        if not isinstance(key, int) or not 0 <= key <= 0xffffffff:
+            return -1
+        start = self._start
+        hashes = self._lookup[0][start:self._stop]
+        i = int(hashes.searchsorted(key, side='right')) - 1
+        if i < 0 or hashes[i] != key:
+            return -1
+        return start + i
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+        return self._make(int(self._lookup[1][i]))
+
+    def __iter__(self):
+        return iter(dict.fromkeys(self._table_hashes[self._start:self._stop].tolist()))
+
+    def __len__(self):
+        return len(set(self._table_hashes[self._start:self._stop].tolist()))
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+
+class RtpcCompactNode:
+    """
+    Read only stand in for an RtpcNode of a RtpcCompactTree, with the same attributes.
+    """
+    __slots__ = ('_tree', '_id')
+
+    def __init__(self, tree: RtpcCompactTree, node_id: int):
+        self._tree = tree
+        self._id = node_id
+
+    @property
+    def name_hash(self):
+        return int(self._tree.columns.node_name_hash[self._id])
+
+    @property
+    def data_offset(self):
+        return int(self._tree.columns.node_data_offset[self._id])
+
+    @property
+    def prop_count(self):
+        return int(self._tree.columns.node_prop_count[self._id])
+
+    @property
+    def child_count(self):
+        return int(self._tree.columns.node_child_count[self._id])
+
+    @property
+    def fingerprint(self) -> Optional[bytes]:
+        return self._tree.fingerprints.get(self._id)
+
+    @fingerprint.setter
+    def fingerprint(self, value):
+        self._tree.fingerprints[self._id] = value
+
+    def _prop_ids(self):
+        start = int(self._tree.columns.node_prop_start[self._id])
+        return range(start, start + self.prop_count)
+
+    @property
+    def prop_table(self) -> List[RtpcCompactProperty]:
+        tree = self._tree
+        return [RtpcCompactProperty(tree, i) for i in self._prop_ids()]
+
+    @property
+    def prop_map(self) -> RtpcCompactMap:
+        tree = self._tree
+        ids = self._prop_ids()
+        return RtpcCompactMap(
+            tree.prop_lookup(), tree.columns.prop_name_hash, ids.start, ids.stop,
+            functools.partial(RtpcCompactProperty, tree))
+
+    @property
+    def child_table(self) -> List['RtpcCompactNode']:
+        tree = self._tree
+        return [RtpcCompactNode(tree, i) for i in tree.node_children(self._id)]
+
+    @property
+    def child_map(self) -> RtpcCompactMap:
+        tree = self._tree
+        start = int(tree.node_child_start[self._id])
+        return RtpcCompactMap(
+            tree.child_lookup(), tree.child_name_hashes(), start, start + self.child_count,
+            functools.partial(RtpcCompactNode, tree))
+
+    def __eq__(self, other):
+        return isinstance(other, RtpcCompactNode) and self._tree is other._tree and self._id == other._id
+
+    def __hash__(self):
+        return hash((id(self._tree), self._id))
+
+    def __repr__(self):
+        return RtpcNode.__repr__(self)
+
+    def repr_with_name(self):
+        return RtpcNode.repr_with_name(self)
+
+
+def rtpc_compact_from_columns(columns: RtpcColumns, rtpc: Optional[Rtpc] = None):
+    """
+    Wrap columns in a RtpcCompactTree, rtpc.root_node is its root proxy.
+    """
+    if rtpc is None:
+        rtpc = Rtpc()
+    rtpc.magic = columns.magic
+    rtpc.version = columns.version
+    rtpc.root_node = RtpcCompactTree(columns).root_node
+    return rtpc
+
+
+def rtpc_compact_from_binary(f_raw, rtpc: Optional[Rtpc] = None):
+    """
+    Decode an RTPC file into the compact representation, f_raw is anything rtpc_from_binary accepts. Code that
+    reads the tree through node/property attributes works unchanged on the result.
+    """
+    return rtpc_compact_from_columns(rtpc_columns_from_binary(f_raw), rtpc)
@@ -0,0 +1,156 @@
+from deca.ff_rtpc import *
+from deca.ff_rtpc_index import rtpc_node_class_hash
+import argparse
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+k_change_added = 'added'
+k_change_removed = 'removed'
+k_change_changed = 'changed'
+
+
+class RtpcChange:
+    """
+    One difference between two trees. path holds the labels of the nodes from the root down to the node that changed
+    (see rtpc_node_label). For a property change prop_hash is the property's name hash and old/new its values, for a
+    node that was added or removed prop_hash is None and old/new is the node.
+    """
+    __slots__ = ('kind', 'path', 'class_name', 'prop_hash', 'old', 'new')
+
+    def __init__(self, kind, path, class_name, prop_hash=None, old=None, new=None):
+        self.kind = kind
+        self.path = path
+        self.class_name = class_name
+        self.prop_hash = prop_hash
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return '{} {} [{}] {}'.format(
+            self.kind, '/'.join(self.path), self.class_name, rtpc_change_details(self))
+
+
+def _prop_str(node: RtpcNode, name_hash) -> Optional[str]:
+    prop = node.prop_map.get(name_hash)
+    if prop is None or prop.type != k_type_str or prop.data is None:
+        return None
+    data = prop.data
+    return data.decode('utf-8', errors='replace') if isinstance(data, bytes) else data
+
+
+def rtpc_node_class_name(node: RtpcNode) -> str:
+    class_name = _prop_str(node, h_prop_class)
+    if class_name is not None:
+        return class_name
+    class_hash = rtpc_node_class_hash(node)
+    return '' if class_hash is None else '0x{:08x}'.format(class_hash)
+
+
+def rtpc_node_label(node: RtpcNode) -> str:
+    # the node's name property (an animal's name, say), else its class, else its name hash
+    return _prop_str(node, h_prop_name) or _prop_str(node, h_prop_class) or '0x{:08x}'.format(node.name_hash)
+
+
+def _value_str(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, array.array):
+        return str(value.tolist())
+    if isinstance(value, RtpcNode):
+        return rtpc_node_label(value)
+    return str(value)
+
+
+def rtpc_change_details(change: RtpcChange, prop_names: Optional[Dict[int, str]] = None) -> str:
+    if change.prop_hash is None:
+        node = change.new if change.kind == k_change_added else change.old
+        return 'node {}'.format(_value_str(node))
+    name = (prop_names or {}).get(change.prop_hash, '0x{:08x}'.format(change.prop_hash))
+    if change.kind == k_change_changed:
+        return '{}: {} -> {}'.format(name, _value_str(change.old), _value_str(change.new))
+    value = change.new if change.kind == k_change_added else change.old
+    return '{}: {}'.format(name, _value_str(value))
+
+
+def _child_keys(children: List[RtpcNode]) -> Dict[Tuple, RtpcNode]:
+    # children are matched by name hash, class and name property; repeats of the same key are matched in order
+    keys = {}
+    seen = {}
+    for child in children:
+        key = (child.name_hash, rtpc_node_class_hash(child), _prop_str(child, h_prop_name))
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        keys[key + (n,)] = child
+    return keys
+
+
+def rtpc_diff(old: RtpcNode, new: RtpcNode) -> Iterator[RtpcChange]:
+    """
+    Yield the differences between the trees under old and new, parent changes before child changes. Fingerprints are
+    computed where missing (see rtpc_node_fingerprint), also for nodes a subtree cache decoded again; subtrees whose
+    fingerprints match are skipped without looking at their properties or children.
+    """
+    rtpc_node_fingerprint(old)
+    rtpc_node_fingerprint(new)
+
+    stack = [((rtpc_node_label(new),), old, new)]
+    while stack:
+        path, a, b = stack.pop()
+        if rtpc_node_fingerprint(a) == rtpc_node_fingerprint(b):
+            continue
+
+        class_name = rtpc_node_class_name(b)
+        a_props = a.prop_map
+        b_props = b.prop_map
+        for prop in b.prop_table:
+            prev = a_props.get(prop.name_hash)
+            if prev is None:
+                yield RtpcChange(k_change_added, path, class_name, prop.name_hash, None, prop.data)
+            elif prev.type != prop.type or \
+                    rtpc_prop_fingerprint_bytes(prev.type, prev.data) != rtpc_prop_fingerprint_bytes(prop.type, prop.data):
+                yield RtpcChange(k_change_changed, path, class_name, prop.name_hash, prev.data, prop.data)
+        for prop in a.prop_table:
+            if prop.name_hash not in b_props:
+                yield RtpcChange(k_change_removed, path, class_name, prop.name_hash, prop.data, None)
+
+        a_children = _child_keys(a.child_table)
+        b_children = _child_keys(b.child_table)
+        pending = []
+        for key, child in b_children.items():
+            prev = a_children.get(key)
+            if prev is None:
+                yield RtpcChange(k_change_added, path, class_name, None, None, child)
+            elif rtpc_node_fingerprint(prev) != rtpc_node_fingerprint(child):
+                pending.append((path + (rtpc_node_label(child),), prev, child))
+        for key, child in a_children.items():
+            if key not in b_children:
+                yield RtpcChange(k_change_removed, path, class_name, None, child, None)
+        stack.extend(reversed(pending))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m deca.ff_rtpc_diff', description='List what changed between two versions of an RTPC file.')
+    parser.add_argument('old', help='previous version of the file')
+    parser.add_argument('new', help='current version of the file')
+    parser.add_argument(
+        '-n', '--names', action='append', default=[],
+        help='property name to show instead of its hash, may be repeated')
+    args = parser.parse_args(argv)
+
+    old = rtpc_from_binary(args.old, fingerprint=True)
+    new = rtpc_from_binary(args.new, fingerprint=True)
+    prop_names = {hash32_func(name): name for name in args.names}
+
+    n = 0
+    for change in rtpc_diff(old.root_node, new.root_node):
+        print('{:8s} {} [{}] {}'.format(
+            change.kind, '/'.join(change.path), change.class_name, rtpc_change_details(change, prop_names)))
+        n += 1
+    print('{} change(s)'.format(n), file=sys.stderr)
+    return 0 if n == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
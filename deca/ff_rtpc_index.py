@@ -0,0 +1,81 @@
+from deca.ff_rtpc import *
+import functools
+from typing import Dict, List, Optional, Union
+
+
+ClassKey = Union[str, bytes, int]
+
+
+@functools.lru_cache(maxsize=4096)
+def rtpc_class_hash(class_name: ClassKey) -> int:
+    if isinstance(class_name, int):
+        return class_name
+    return hash32_func(class_name)
+
+
+def rtpc_node_class_hash(node: RtpcNode) -> Optional[int]:
+    """
+    Hash of the node's _class, taken from its _class_hash property when present so no string is decoded.
+    """
+    prop_map = node.prop_map
+    prop = prop_map.get(h_prop_class_hash)
+    if prop is not None and prop.type == k_type_u32:
+        return prop.data
+    prop = prop_map.get(h_prop_class)
+    # str when the strings were decoded (decode_strings=True)
+    if prop is not None and isinstance(prop.data, (bytes, str)):
+        return hash32_func(prop.data)
+    return None
+
+
+class RtpcClassIndex:
+    """
+    Maps _class names (or their hash32) to nodes, for the whole tree under root and per parent node. The per parent
+    index of a node is built the first time one of its children is looked up, the global index the first time
+    nodes() is called, or up front with build=True.
+    """
+    def __init__(self, root: RtpcNode, build=False):
+        self.root = root
+        self._by_class: Optional[Dict[int, List[RtpcNode]]] = None
+        self._by_parent: Dict[int, Dict[int, List[RtpcNode]]] = {}
+        if build:
+            self.nodes(0)
+
+    def _parent_index(self, parent: RtpcNode) -> Dict[int, List[RtpcNode]]:
+        index = self._by_parent.get(parent.data_offset)
+        if index is None:
+            index = {}
+            for child in parent.child_table:
+                class_hash = rtpc_node_class_hash(child)
+                if class_hash is not None:
+                    index.setdefault(class_hash, []).append(child)
+            self._by_parent[parent.data_offset] = index
+        return index
+
+    def nodes(self, class_name: ClassKey) -> List[RtpcNode]:
+        """
+        Every node of the given class in the tree, in depth first order.
+        """
+        if self._by_class is None:
+            by_class = {}
+            for depth, node in rtpc_iter_nodes(self.root):
+                class_hash = rtpc_node_class_hash(node)
+                if class_hash is not None:
+                    by_class.setdefault(class_hash, []).append(node)
+            self._by_class = by_class
+        return self._by_class.get(rtpc_class_hash(class_name), [])
+
+    def children(self, parent: RtpcNode, class_name: ClassKey) -> List[RtpcNode]:
+        """
+        Children of parent of the given class, in child order.
+        """
+        return self._parent_index(parent).get(rtpc_class_hash(class_name), [])
+
+    def child(self, parent: RtpcNode, class_name: ClassKey) -> Optional[RtpcNode]:
+        """
+        First child of parent of the given class, or None.
+        """
+        children = self.children(parent, class_name)
+        if children:
+            return children[0]
+        return None
@@ -0,0 +1,102 @@
+from deca.ff_rtpc import *
+import collections
+from typing import Optional
+
+
+# rough in memory cost of decoded objects, used for the byte budget
+k_prop_bytes = 160
+k_node_bytes = 200
+k_map_entry_bytes = 40
+
+k_entry_props = 0
+k_entry_children = 1
+
+
+def rtpc_value_nbytes(value):
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    elif isinstance(value, array.array):
+        return value.itemsize * len(value)
+    elif isinstance(value, list):
+        return 8 * len(value)
+    return 0
+
+
+class RtpcSubtreeCache:
+    """
+    Size bounded LRU cache for the decoded parts of lazy trees (see rtpc_from_binary(subtree_cache=...)). For each
+    node the cache holds its properties and its child nodes' headers, keyed by the node's data_offset within its file.
+    Entries past max_bytes (estimated) or max_nodes (nodes plus properties held) are evicted least recently used
+    first, and are decoded again from the file's buffer when next accessed. One cache can serve many files.
+    """
+    def __init__(self, max_bytes: Optional[int] = 64 * 1024 * 1024, max_nodes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_nodes = max_nodes
+        self.nbytes = 0
+        self.nodes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (kind, string table of the file, data_offset) -> (table, map, bytes, nodes)
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return 'RtpcSubtreeCache(entries={}, nodes={}, nbytes={}, hits={}, misses={}, evictions={})'.format(
+            len(self._entries), self.nodes, self.nbytes, self.hits, self.misses, self.evictions)
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+        self.nodes = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        self.nbytes += entry[2]
+        self.nodes += entry[3]
+        # the entry just added always stays, even when it alone is over budget
+        while len(self._entries) > 1 and (
+                (self.max_bytes is not None and self.nbytes > self.max_bytes) or
+                (self.max_nodes is not None and self.nodes > self.max_nodes)):
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted[2]
+            self.nodes -= evicted[3]
+            self.evictions += 1
+
+    def props(self, node: RtpcNode):
+        # (prop_table, prop_map) of node
+        key = (k_entry_props, node._strings, node.data_offset)
+        entry = self._get(key)
+        if entry is None:
+            table = rtpc_prop_table_from_binary(node._buf, node.data_offset, node.prop_count, node._strings)
+            nbytes = sum(k_prop_bytes + k_map_entry_bytes + rtpc_value_nbytes(prop.data) for prop in table)
+            entry = (table, {prop.name_hash: prop for prop in table}, nbytes, len(table))
+            self._put(key, entry)
+        return entry
+
+    def children(self, node: RtpcNode):
+        # (child_table, child_map) of node, the children are lazy nodes using this cache
+        key = (k_entry_children, node._strings, node.data_offset)
+        entry = self._get(key)
+        if entry is None:
+            table = []
+            p = rtpc_node_children_offset(node)
+            for i in range(node.child_count):
+                child = RtpcNode()
+                p = rtpc_node_from_binary(node._buf, p, child, lazy=True, strings=node._strings, subtree_cache=self)
+                table.append(child)
+            nbytes = len(table) * (k_node_bytes + k_map_entry_bytes)
+            entry = (table, {child.name_hash: child for child in table}, nbytes, len(table))
+            self._put(key, entry)
+        return entry
@@ -0,0 +1,181 @@
+from deca.errors import EDecaErrorParse, EDecaFileMissing, EDecaIncorrectFileFormat, EDecaOutOfData
+from deca.ff_rtpc import *
+from deca.ff_rtpc import _node_header
+from deca.ff_rtpc_columns import RtpcColumns, rtpc_columns_from_binary, rtpc_columns_from_buffer, rtpc_node_from_columns
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence
+import argparse
+import functools
+import os
+import sys
+import time
+
+
+k_rtpc_file_patterns = ('*.blo', '*.bin')
+
+
+class RtpcFileResult:
+    """
+    Outcome of decoding one file in a worker: the file's columns (see deca.ff_rtpc_columns), or the deca.errors
+    exception that stopped it.
+    """
+    __slots__ = ('path', 'columns', 'error')
+
+    def __init__(self, path: str, columns: Optional[RtpcColumns] = None, error: Optional[Exception] = None):
+        self.path = path
+        self.columns = columns
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return '{}: {}: {}'.format(self.path, type(self.error).__name__, self.error)
+        return '{}: nodes:{} props:{}'.format(self.path, len(self.columns), len(self.columns.prop_type))
+
+
+def rtpc_columns_from_file(path) -> RtpcFileResult:
+    """
+    Decode one file, turning any failure into an error on the result so one bad file does not stop a batch.
+    """
+    path = str(path)
+    try:
+        return RtpcFileResult(path, columns=rtpc_columns_from_binary(path))
+    except FileNotFoundError as e:
+        error = EDecaFileMissing(str(e))
+    except (EDecaErrorParse, EDecaIncorrectFileFormat, EDecaOutOfData) as e:
+        error = e
+    except Exception as e:
+        error = EDecaErrorParse('{}: {}'.format(type(e).__name__, e))
+    return RtpcFileResult(path, error=error)
+
+
+def rtpc_find_files(roots: Iterable, patterns: Sequence[str] = k_rtpc_file_patterns) -> List[str]:
+    files = []
+    for root in roots:
+        root = Path(root)
+        if root.is_dir():
+            found = set()
+            for pattern in patterns:
+                found.update(root.rglob(pattern))
+            files.extend(sorted(str(f) for f in found if f.is_file()))
+        else:
+            files.append(str(root))
+    return files
+
+
+def rtpc_columns_from_files(paths: Iterable, workers: Optional[int] = None, chunksize=1) -> List[RtpcFileResult]:
+    """
+    Decode many RTPC files in a process pool, returning one result per path in input order. workers defaults to the
+    cpu count, chunksize is how many paths are sent to a worker at a time. With workers=1 no pool is started.
+    """
+    paths = [str(p) for p in paths]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+    if workers == 1:
+        return [rtpc_columns_from_file(p) for p in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(rtpc_columns_from_file, paths, chunksize=chunksize))
+
+
+def rtpc_subtree_columns_from_file(path, pos) -> RtpcColumns:
+    # worker side of rtpc_from_binary_parallel, the file is memory mapped so all workers share its pages
+    return rtpc_columns_from_buffer(rtpc_buffer(path), pos)
+
+
+def rtpc_from_binary_parallel(
+        path, rtpc: Optional[Rtpc] = None, workers: Optional[int] = None, tasks_per_worker=4, chunksize=1):
+    """
+    Decode one RTPC file with its subtrees spread over a process pool. Child headers carry absolute data offsets, so
+    subtrees decode independently: the top of the tree is expanded level by level, header only, until there are at
+    least tasks_per_worker subtrees per worker. Each subtree is decoded in a worker (see deca.ff_rtpc_columns), the
+    nodes above them are decoded here, and the results are stitched into one eager tree. Workers reopen the file, so
+    path must be a file path, not bytes or a file object. With workers=1 no pool is started, the file is decoded by
+    rtpc_from_binary.
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        raise TypeError('rtpc_from_binary_parallel needs a file path, got {}'.format(type(path).__name__))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return rtpc_from_binary(path, rtpc)
+    if rtpc is None:
+        rtpc = Rtpc()
+
+    buf = rtpc_buffer(path)
+    rtpc.magic = bytes(buf[0:4])
+    if rtpc.magic != b'RTPC':
+        raise EDecaIncorrectFileFormat('Bad MAGIC {}'.format(rtpc.magic))
+    rtpc.strings = RtpcStringTable(buf)
+
+    try:
+        rtpc.version = struct.unpack_from('<I', buf, 4)[0]
+        rtpc.root_node = RtpcNode()
+        rtpc_node_header_from_binary(buf, 8, rtpc.root_node)
+
+        # nodes decoded here, and (node, header position) of the subtrees left for the workers
+        local = []
+        frontier = [(rtpc.root_node, 8)]
+        while frontier and len(frontier) < workers * tasks_per_worker:
+            expanded = []
+            for node, pos in frontier:
+                local.append(node)
+                p = rtpc_node_children_offset(node)
+                node.child_table = []
+                node.child_map = {}
+                for i in range(node.child_count):
+                    child = RtpcNode()
+                    rtpc_node_header_from_binary(buf, p, child)
+                    node.child_table.append(child)
+                    node.child_map[child.name_hash] = child
+                    if child.child_count:
+                        expanded.append((child, p))
+                    else:
+                        local.append(child)
+                    p += _node_header.size
+            frontier = expanded
+
+        rtpc_nodes_props_from_binary(buf, local, rtpc.strings)
+    except struct.error as e:
+        raise EDecaOutOfData('RTPC data truncated: {}'.format(e)) from e
+
+    if frontier:
+        task = functools.partial(rtpc_subtree_columns_from_file, os.fspath(path))
+        with ProcessPoolExecutor(max_workers=min(workers, len(frontier))) as executor:
+            subtrees = executor.map(task, [pos for node, pos in frontier], chunksize=chunksize)
+            for (node, pos), columns in zip(frontier, subtrees):
+                subtree = rtpc_node_from_columns(columns)
+                node.prop_table = subtree.prop_table
+                node.prop_map = subtree.prop_map
+                node.child_table = subtree.child_table
+                node.child_map = subtree.child_map
+
+    return rtpc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Decode RTPC files in parallel')
+    parser.add_argument('paths', nargs='+', help='files, or directories to search')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes, default cpu count')
+    parser.add_argument('-c', '--chunksize', type=int, default=1, help='files sent to a worker at a time')
+    parser.add_argument(
+        '-p', '--pattern', action='append', default=None,
+        help='file pattern in directories, may be repeated, default {}'.format(' '.join(k_rtpc_file_patterns)))
+    args = parser.parse_args(argv)
+
+    files = rtpc_find_files(args.paths, args.pattern or k_rtpc_file_patterns)
+    t0 = time.perf_counter()
+    results = rtpc_columns_from_files(files, workers=args.workers, chunksize=args.chunksize)
+    elapsed = time.perf_counter() - t0
+
+    failed = 0
+    for result in results:
+        print(result)
+        if result.error is not None:
+            failed += 1
+    print('{} files, {} failed, {:.3f}s'.format(len(results), failed, elapsed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
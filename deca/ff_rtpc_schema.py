@@ -0,0 +1,72 @@
+from deca.ff_rtpc import *
+import collections
+import operator
+from typing import Dict, Tuple
+
+
+class RtpcSchemaAccessor:
+    """
+    Reads the fields of one layout, indices holds the prop_table position of each field or None when missing.
+    """
+    __slots__ = ('indices', 'complete', '_record_type', '_getter')
+
+    def __init__(self, record_type, indices):
+        self.indices = indices
+        self.complete = None not in indices
+        self._record_type = record_type
+        present = [i for i in indices if i is not None]
+        if len(present) == 1:
+            i = present[0]
+            self._getter = lambda table: (table[i], )
+        elif present:
+            self._getter = operator.itemgetter(*present)
+        else:
+            self._getter = lambda table: ()
+
+    def __call__(self, prop_table):
+        values = [prop.data for prop in self._getter(prop_table)]
+        if not self.complete:
+            it = iter(values)
+            values = [None if i is None else next(it) for i in self.indices]
+        return self._record_type._make(values)
+
+
+class RtpcSchema:
+    """
+    Named fields of an RTPC class. fields maps a python field name to the RTPC property name, whose hash32 is the
+    property's name_hash. Properties are stored sorted by name_hash, so a game patch that adds or removes a property
+    shifts the position of the others; the schema finds fields by hash instead. For each distinct layout (the
+    sequence of name_hashes of a node's prop_table) an accessor is compiled once and cached, reading a node is then
+    a single positional gather. Fields missing from a layout read as None.
+    """
+    def __init__(self, class_name: str, fields: Dict[str, str]):
+        self.class_name = class_name
+        self.fields = dict(fields)
+        self.field_hashes = {field: hash32_func(prop_name) for field, prop_name in self.fields.items()}
+        self.record_type = collections.namedtuple(class_name, list(self.fields))
+        self._accessors = {}
+
+    def __repr__(self):
+        return 'RtpcSchema({}, {} fields, {} layouts)'.format(self.class_name, len(self.fields), len(self._accessors))
+
+    def compile(self, signature: Tuple[int, ...]) -> 'RtpcSchemaAccessor':
+        positions = {name_hash: i for i, name_hash in enumerate(signature)}
+        return RtpcSchemaAccessor(self.record_type, [positions.get(h) for h in self.field_hashes.values()])
+
+    def accessor(self, node: RtpcNode) -> RtpcSchemaAccessor:
+        prop_table = node.prop_table
+        signature = tuple(prop.name_hash for prop in prop_table)
+        accessor = self._accessors.get(signature)
+        if accessor is None:
+            accessor = self.compile(signature)
+            self._accessors[signature] = accessor
+        return accessor
+
+    def has_fields(self, node: RtpcNode) -> bool:
+        return self.accessor(node).complete
+
+    def read(self, node: RtpcNode):
+        """
+        The node's fields as a record_type namedtuple.
+        """
+        return self.accessor(node)(node.prop_table)
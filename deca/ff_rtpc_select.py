@@ -0,0 +1,265 @@
+"""
+Path selectors over RTPC trees. A selector is a sequence of steps separated by '/' (children of the current nodes)
+or '//' (all descendants of the current nodes), evaluated from the children of the root, e.g.
+
+    */CAnimalType/CAnimalTypeScoringSettings[0]/SAnimalTypeScoringDistributionSettings[@name~"(?i)^male_"]
+    //SAnimalTypeVisualVariation[@probability>0][@gender=1]
+
+A step is '*' (any node), a _class name, a _class hash (0x1234abcd) or a node name hash (#0x1234abcd), followed by
+any number of predicates:
+    [@field]                  the node has the property
+    [@field <op> literal]     op is one of = != < <= > >= and ~ (regex search), the literal a "string" or number
+    [n]                       only the n-th (from 0) node selected by the step so far, per context node: per
+                              parent after '/', but after '//' among all descendants of the context node, so
+                              //Foo[0] from the root gives one node for the whole document
+Fields are property names or hashes (0x1234abcd). String comparisons, ~ included, are case sensitive: start a ~
+pattern with (?i) to ignore case, as in the first example (the file has Male_Scoring, not male_scoring).
+"""
+
+from deca.ff_rtpc import *
+from deca.ff_rtpc_index import RtpcClassIndex, rtpc_node_class_hash
+import functools
+import operator
+import re
+from typing import Callable, Iterator, List, Optional, Union
+
+
+_token_re = re.compile(r'''
+    \s*(?:
+        (?P<descendant>//) | (?P<child>/) | (?P<open>\[) | (?P<close>\]) | (?P<at>@) | (?P<any>\*) |
+        (?P<op>!=|<=|>=|=|<|>|~) |
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*') |
+        (?P<name_hash>\#0[xX][0-9a-fA-F]+) |
+        (?P<hex>0[xX][0-9a-fA-F]+) |
+        (?P<number>-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?) |
+        (?P<name>[A-Za-z_][A-Za-z0-9_.:]*)
+    )''', re.VERBOSE)
+
+_compare_ops = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+k_axis_child = 0
+k_axis_descendant = 1
+
+
+def _tokenize(path):
+    tokens = []
+    pos = 0
+    path = path.rstrip()
+    while pos < len(path):
+        m = _token_re.match(path, pos)
+        if m is None or m.end() == pos:
+            raise EDecaErrorParse('Bad selector {!r}: unexpected {!r} at {}'.format(path, path[pos:pos + 10], pos))
+        tokens.append((m.lastgroup, m.group(m.lastgroup)))
+        pos = m.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+def _field_value(prop):
+    value = prop.data
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def _field_predicate(field_hash, op=None, literal=None):
+    if op is None:
+        return lambda node: field_hash in node.prop_map
+
+    if op == '~':
+        try:
+            pattern = re.compile(str(literal))
+        except re.error as e:
+            raise EDecaErrorParse('Bad selector pattern {!r}: {}'.format(literal, e)) from e
+
+        def predicate(node):
+            prop = node.prop_map.get(field_hash)
+            return prop is not None and pattern.search(str(_field_value(prop))) is not None
+        return predicate
+
+    compare = _compare_ops[op]
+    literal_f32 = _f32_round(literal) if isinstance(literal, (int, float)) else None
+
+    def predicate(node):
+        prop = node.prop_map.get(field_hash)
+        if prop is None:
+            return False
+        value = _field_value(prop)
+        # compare f32 values with the literal as stored in an f32, so 0.9 matches 0.9
+        other = literal_f32 if prop.type == k_type_f32 and literal_f32 is not None else literal
+        try:
+            return compare(value, other)
+        except TypeError:
+            return False
+    return predicate
+
+
+def _f32_round(value):
+    try:
+        return struct.unpack('<f', struct.pack('<f', value))[0]
+    except (OverflowError, struct.error):
+        return value
+
+
+class RtpcSelectorStep:
+    __slots__ = ('axis', 'class_hash', 'name_hash', 'predicates')
+
+    def __init__(self, axis):
+        self.axis = axis
+        self.class_hash: Optional[int] = None
+        self.name_hash: Optional[int] = None
+        # callables filtering nodes, or ints picking one node by position
+        self.predicates: List[Union[Callable, int]] = []
+
+
+class RtpcSelector:
+    """
+    A compiled selector, see rtpc_selector. Calling it with a node (and optionally a RtpcClassIndex of the tree)
+    returns a lazy iterator over the matching nodes in document order.
+    """
+    def __init__(self, path: str, steps: List[RtpcSelectorStep]):
+        self.path = path
+        self.steps = steps
+
+    def __repr__(self):
+        return 'RtpcSelector({!r})'.format(self.path)
+
+    def __call__(self, node, index: Optional[RtpcClassIndex] = None) -> Iterator[RtpcNode]:
+        nodes = iter([node])
+        for step in self.steps:
+            nodes = self._step(step, nodes, index)
+        return nodes
+
+    @staticmethod
+    def _candidates(step: RtpcSelectorStep, node, index: Optional[RtpcClassIndex]):
+        class_hash = step.class_hash
+        if step.axis == k_axis_child:
+            if class_hash is not None and index is not None:
+                return index.children(node, class_hash)
+            candidates = node.child_table
+        elif class_hash is not None and index is not None and node.data_offset == index.root.data_offset:
+            # every node of the class in the tree, in document order
+            return [n for n in index.nodes(class_hash) if n.data_offset != node.data_offset]
+        else:
+            candidates = (n for depth, n in rtpc_iter_nodes(node) if depth > 0)
+
+        if class_hash is not None:
+            candidates = (n for n in candidates if rtpc_node_class_hash(n) == class_hash)
+        return candidates
+
+    def _step(self, step: RtpcSelectorStep, nodes, index: Optional[RtpcClassIndex]):
+        # descendants of nested context nodes would otherwise be yielded more than once
+        seen = set() if step.axis == k_axis_descendant else None
+        for node in nodes:
+            candidates = self._candidates(step, node, index)
+            if step.name_hash is not None:
+                candidates = (n for n in candidates if n.name_hash == step.name_hash)
+            for predicate in step.predicates:
+                if isinstance(predicate, int):
+                    candidates = list(candidates)[predicate:predicate + 1]
+                else:
+                    candidates = filter(predicate, candidates)
+            for candidate in candidates:
+                if seen is not None:
+                    if candidate.data_offset in seen:
+                        continue
+                    seen.add(candidate.data_offset)
+                yield candidate
+
+
+def _parse_hash(token):
+    kind, value = token
+    if kind == 'hex':
+        return int(value, 16)
+    return hash32_func(value)
+
+
+def _parse_literal(token, path):
+    kind, value = token
+    if kind == 'string':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    elif kind == 'hex':
+        return int(value, 16)
+    elif kind == 'number':
+        if re.fullmatch(r'-?\d+', value):
+            return int(value)
+        return float(value)
+    raise EDecaErrorParse('Bad selector {!r}: expected a literal, got {!r}'.format(path, value))
+
+
+@functools.lru_cache(maxsize=256)
+def rtpc_selector(path: str) -> RtpcSelector:
+    """
+    Parse and compile a selector (see the module documentation). Compiled selectors are cached by path.
+    """
+    tokens = _tokenize(path)
+    i = 0
+
+    def expect(*kinds):
+        nonlocal i
+        kind, value = tokens[i]
+        if kind not in kinds:
+            raise EDecaErrorParse('Bad selector {!r}: expected {}, got {!r}'.format(path, ' or '.join(kinds), value))
+        i += 1
+        return kind, value
+
+    steps = []
+    axis = k_axis_child
+    if tokens[i][0] in ('child', 'descendant'):
+        axis = k_axis_descendant if tokens[i][0] == 'descendant' else k_axis_child
+        i += 1
+
+    while True:
+        step = RtpcSelectorStep(axis)
+        kind, value = expect('any', 'name', 'hex', 'name_hash')
+        if kind == 'name_hash':
+            step.name_hash = int(value[1:], 16)
+        elif kind != 'any':
+            step.class_hash = _parse_hash((kind, value))
+
+        while tokens[i][0] == 'open':
+            i += 1
+            if tokens[i][0] == 'number':
+                kind, value = expect('number')
+                if not re.fullmatch(r'\d+', value):
+                    raise EDecaErrorParse('Bad selector {!r}: bad position {!r}'.format(path, value))
+                step.predicates.append(int(value))
+            else:
+                expect('at')
+                field_hash = _parse_hash(expect('name', 'hex'))
+                if tokens[i][0] == 'op':
+                    kind, op = expect('op')
+                    step.predicates.append(_field_predicate(field_hash, op, _parse_literal(tokens[i], path)))
+                    i += 1
+                else:
+                    step.predicates.append(_field_predicate(field_hash))
+            expect('close')
+
+        steps.append(step)
+        kind, value = expect('child', 'descendant', 'end')
+        if kind == 'end':
+            break
+        axis = k_axis_descendant if kind == 'descendant' else k_axis_child
+
+    return RtpcSelector(path, steps)
+
+
+def rtpc_select(target, path: str, index: Optional[RtpcClassIndex] = None) -> Iterator[RtpcNode]:
+    """
+    Nodes under target (an Rtpc or a node) matching the selector path, as a lazy iterator. For an Rtpc the class
+    index of the tree is built on first use and kept in rtpc.class_index.
+    """
+    if isinstance(target, Rtpc):
+        if index is None:
+            if target.class_index is None:
+                target.class_index = RtpcClassIndex(target.root_node)
+            index = target.class_index
+        target = target.root_node
+    return rtpc_selector(path)(target, index)
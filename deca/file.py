@@ -1,4 +1,7 @@
+import array
 import struct
+import sys
+import numpy as np
 from deca.errors import EDecaOutOfData
 
 class ArchiveFile:
@@ -26,23 +29,19 @@ class ArchiveFile:
     def write(self, blk):
         return self.f.write(blk)
 
-    def read_strz(self, delim=b'\00'):
-        eof = False
-        r = b''
+    def read_strz(self, delim=b'\00', block_size=256):
+        r = []
         while True:
-            v = self.f.read(1)
+            pos = self.f.tell()
+            v = self.f.read(block_size)
             if len(v) == 0:
-                eof = True
-                break
-            elif v == delim:
-                break
-            else:
-                r = r + v
-
-        if eof:
-            return None
-        else:
-            return r
+                return None
+            end = v.find(delim)
+            if end >= 0:
+                r.append(v[:end])
+                self.f.seek(pos + end + len(delim))
+                return b''.join(r)
+            r.append(v)
 
     def read_base(self, fmt, elen, n, raise_on_no_data):
         if n is None:
@@ -81,8 +80,14 @@ class ArchiveFile:
             return sl
 
     def read_strl(self, n=None, raise_on_no_data=False):
-        v = self.read_base('c', 1, n, raise_on_no_data)
-        return b''.join(v)
+        if n is None:
+            n = 1
+        buf = self.f.read(n)
+        if len(buf) != n:
+            if raise_on_no_data:
+                raise EDecaOutOfData()
+            return None
+        return buf
 
     def read_s8(self, n=None, raise_on_no_data=False):
         return self.read_base('b', 1, n, raise_on_no_data)
@@ -114,6 +119,68 @@ class ArchiveFile:
     def read_f64(self, n=None, raise_on_no_data=False):
         return self.read_base('d', 8, n, raise_on_no_data)
 
+    def read_array(self, typecode, n, raise_on_no_data=False):
+        """
+        Read n little endian values into an array.array of the given typecode, one read and no per value unpacking.
+        """
+        v = array.array(typecode)
+        buf = self.f.read(v.itemsize * n)
+        if len(buf) != v.itemsize * n:
+            if raise_on_no_data:
+                raise EDecaOutOfData()
+            return None
+        v.frombytes(buf)
+        if sys.byteorder != 'little':
+            v.byteswap()
+        return v
+
+    def read_np(self, dtype, n, raise_on_no_data=False):
+        """
+        Read n values as a read only NumPy array. When the file is an in memory buffer (io.BytesIO) the array is a view
+        of it, otherwise it wraps the bytes read without another copy. A view pins the BytesIO: while the array, or
+        anything derived from it without a copy, is alive, writes that would resize the file raise BufferError. Take
+        .copy() of the result to keep the values past such writes.
+        """
+        dtype = np.dtype(dtype)
+        size = dtype.itemsize * n
+        pos = self.f.tell()
+        getbuffer = getattr(self.f, 'getbuffer', None)
+        if getbuffer is not None:
+            mem = getbuffer()
+            if pos + size > len(mem):
+                if raise_on_no_data:
+                    raise EDecaOutOfData()
+                return None
+            v = np.frombuffer(mem, dtype=dtype, count=n, offset=pos)
+            self.f.seek(pos + size)
+        else:
+            buf = self.f.read(size)
+            if len(buf) != size:
+                if raise_on_no_data:
+                    raise EDecaOutOfData()
+                return None
+            v = np.frombuffer(buf, dtype=dtype, count=n)
+        v.flags.writeable = False
+        return v
+
+    def read_u8s(self, n, raise_on_no_data=False):
+        return self.read_array('B', n, raise_on_no_data)
+
+    def read_u16s(self, n, raise_on_no_data=False):
+        return self.read_array('H', n, raise_on_no_data)
+
+    def read_u32s(self, n, raise_on_no_data=False):
+        return self.read_array('I', n, raise_on_no_data)
+
+    def read_u64s(self, n, raise_on_no_data=False):
+        return self.read_array('Q', n, raise_on_no_data)
+
+    def read_f32s(self, n, raise_on_no_data=False):
+        return self.read_array('f', n, raise_on_no_data)
+
+    def read_f64s(self, n, raise_on_no_data=False):
+        return self.read_array('d', n, raise_on_no_data)
+
     def write_base(self, fmt, elen, v):
         if isinstance(v, list) or isinstance(v, tuple):
             buf = struct.pack(fmt * len(v), *v)
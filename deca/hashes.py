@@ -13,6 +13,9 @@ Original copyright notice:
 '''
 
 
+import numpy as np
+
+
 class CostModel(object):
     def __init__(self, max_inlines):
         self._count = 0
@@ -99,4 +102,68 @@ def hash32_func_bytes(data, init_val=0):
 def hash32_func(data, init_val=0):
     if isinstance(data, str):
         data = data.encode('ascii')
-    return hash32_func_bytes(data, init_val)
\ No newline at end of file
+    return hash32_func_bytes(data, init_val)
+
+def _rot_np(x, k):
+    return (x << np.uint32(k)) | (x >> np.uint32(32 - k))
+
+
+def _mix_np(a, b, c):
+    a -= c; a ^= _rot_np(c, 4);  c += b
+    b -= a; b ^= _rot_np(a, 6);  a += c
+    c -= b; c ^= _rot_np(b, 8);  b += a
+    a -= c; a ^= _rot_np(c, 16); c += b
+    b -= a; b ^= _rot_np(a, 19); a += c
+    c -= b; c ^= _rot_np(b, 4);  b += a
+
+
+def _final_np(a, b, c):
+    c ^= b; c -= _rot_np(b, 14)
+    a ^= c; a -= _rot_np(c, 11)
+    b ^= a; b -= _rot_np(a, 25)
+    c ^= b; c -= _rot_np(b, 16)
+    a ^= c; a -= _rot_np(c, 4)
+    b ^= a; b -= _rot_np(a, 14)
+    c ^= b; c -= _rot_np(b, 24)
+
+
+def hash32_batch(items, init_val=0):
+    '''
+    hash32_func over a list of str/bytes at once, returns a uint32 array in input order. Inputs are grouped by
+    length, zero padded to whole 12 byte blocks and hashed as NumPy uint32 lanes, one lane per string; uint32
+    arithmetic wraps, so no masking is needed.
+    '''
+    items = [v.encode('ascii') if isinstance(v, str) else bytes(v) for v in items]
+    result = np.zeros(len(items), dtype=np.uint32)
+
+    groups = {}
+    for i, v in enumerate(items):
+        groups.setdefault(len(v), []).append(i)
+
+    for length, idx in groups.items():
+        init = np.uint32((0xdeadbeef + length + init_val) & 0xffffffff)
+        a = np.full(len(idx), init, dtype=np.uint32)
+        b = a.copy()
+        c = a.copy()
+
+        if length == 0:
+            result[idx] = c
+            continue
+
+        blocks = (length + 11) // 12
+        buf = np.zeros((len(idx), blocks * 12), dtype=np.uint8)
+        buf[:, :length] = np.frombuffer(b''.join(items[i] for i in idx), dtype=np.uint8).reshape(len(idx), length)
+        words = buf.view('<u4').reshape(len(idx), blocks, 3)
+
+        # every block but the last is mixed, the last (zero padded) block goes through final
+        for block in range(blocks):
+            a += words[:, block, 0]
+            b += words[:, block, 1]
+            c += words[:, block, 2]
+            if block < blocks - 1:
+                _mix_np(a, b, c)
+        _final_np(a, b, c)
+
+        result[idx] = c
+
+    return result
@@ -0,0 +1,235 @@
+"""
+Local HTTP/JSON server for the animal data. The .blo file is processed once and every response is rendered up front,
+so a request is a dictionary lookup. The file is watched and reloaded in the background when it changes.
+
+  GET /animals                   names of all animals
+  GET /animals/<name>            details, levels, scores and furs of one animal
+  GET /animals/<name>/levels     difficulty levels of one animal
+  GET /animals/<name>/furs       fur variations of one animal
+  GET /details                   same content as animal_details.json
+  GET /levels                    difficulty levels of all animals
+  GET /furs                      fur variations of all animals
+  GET /status                    data file, load time and request count
+"""
+
+from animals import _open_rtpc, _get_animals, _process_scores, _group_scores, _process_fur_variations, _create_animal_details, AnimalGroupScores, FurVariationGroup, Levels
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, unquote
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {
+  200: "OK",
+  304: "Not Modified",
+  400: "Bad Request",
+  404: "Not Found",
+  405: "Method Not Allowed",
+  413: "Content Too Large",
+  431: "Request Header Fields Too Large",
+  501: "Not Implemented",
+}
+
+def _levels_json(group_score: AnimalGroupScores) -> dict:
+  return {
+    "level": group_score.level,
+    "levels": [{"name": Levels(i + 1).name, "low_weight": low, "high_weight": high} for i, (low, high) in enumerate(group_score.level_values)],
+  }
+
+def _furs_json(fur_group: FurVariationGroup) -> list:
+  return [{
+    "index": fur.index,
+    "type": fur.type,
+    "gender": fur.gender,
+    "rarity": fur.rarity,
+    "prob": fur.prob
+  } for fur in fur_group.furs]
+
+def _scores_json(group_score: AnimalGroupScores) -> list:
+  return [{
+    "gender": score.gender,
+    "low_score": score.low_score,
+    "high_score": score.high_score,
+    "low_weight": score.low_weight,
+    "high_weight": score.high_weight
+  } for score in group_score.gendered_scores]
+
+def _render(value) -> Tuple[bytes, str]:
+  body = json.dumps(value, indent=2).encode("utf-8")
+  return body, '"{}"'.format(hashlib.blake2b(body, digest_size=16).hexdigest())
+
+def _build_responses(filename: str) -> Dict[str, Tuple[bytes, str]]:
+  animals = _get_animals(_open_rtpc(filename))
+  group_scores = {x.animal_name: x for x in _group_scores(_process_scores(animals))}
+  fur_groups = {x.animal_name: x for x in _process_fur_variations(animals)}
+  names = sorted(set(group_scores) | set(fur_groups))
+
+  content = {
+    "/animals": names,
+    "/details": {name: _create_animal_details(group_scores[name]) for name in names if name in group_scores},
+    "/levels": {name: _levels_json(group_scores[name]) for name in names if name in group_scores},
+    "/furs": {name: _furs_json(fur_groups[name]) for name in names if name in fur_groups},
+  }
+  for name in names:
+    animal = {"name": name}
+    if name in group_scores:
+      animal.update(_create_animal_details(group_scores[name]))
+      animal.update(_levels_json(group_scores[name]))
+      animal["scores"] = _scores_json(group_scores[name])
+      content[f"/animals/{name}/levels"] = _levels_json(group_scores[name])
+    if name in fur_groups:
+      animal["furs"] = _furs_json(fur_groups[name])
+      content[f"/animals/{name}/furs"] = _furs_json(fur_groups[name])
+    content[f"/animals/{name}"] = animal
+  return {path: _render(value) for path, value in content.items()}
+
+class AnimalServer:
+  def __init__(self, filename: str, reload_interval: float = 1.0) -> None:
+    self.filename = filename
+    self.reload_interval = reload_interval
+    self.responses: Dict[str, Tuple[bytes, str]] = {}
+    self.file_stat: Optional[Tuple[int, int]] = None
+    self.loaded_at = None
+    self.requests = 0
+
+  def _stat(self) -> Tuple[int, int]:
+    st = os.stat(self.filename)
+    return st.st_size, st.st_mtime_ns
+
+  async def load(self) -> None:
+    # processing runs in a worker thread, requests keep being served from the old responses until it is done
+    file_stat = self._stat()
+    responses = await asyncio.get_running_loop().run_in_executor(None, _build_responses, self.filename)
+    self.responses = responses
+    self.file_stat = file_stat
+    self.loaded_at = time.time()
+    print(f"loaded {self.filename} ({len(responses)} responses)")
+
+  async def watch(self) -> None:
+    while True:
+      await asyncio.sleep(self.reload_interval)
+      try:
+        if self._stat() != self.file_stat:
+          await self.load()
+      except Exception as e:
+        # a half written or broken file, keep serving the last good data and try again later
+        print(f"reload of {self.filename} failed: {e!r}")
+
+  def _status(self) -> Tuple[bytes, str]:
+    return _render({
+      "file": self.filename,
+      "loaded_at": self.loaded_at,
+      "responses": len(self.responses),
+      "requests": self.requests
+    })
+
+  def respond(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, bytes, Optional[str]]:
+    if method not in ("GET", "HEAD"):
+      return 405, b"", None
+    path = unquote(urlsplit(target).path).rstrip("/") or "/"
+    if path == "/status":
+      response = self._status()
+    else:
+      response = self.responses.get(path)
+    if response is None:
+      return 404, b"", None
+    body, etag = response
+    if etag in [x.strip() for x in headers.get("if-none-match", "").split(",")]:
+      return 304, b"", etag
+    return 200, body, etag
+
+  async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+      while True:
+        try:
+          head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+          await self._write(writer, 431, b"", None, False, False)
+          break
+        except asyncio.IncompleteReadError:
+          break
+
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        if len(parts) != 3:
+          await self._write(writer, 400, b"", None, False, False)
+          break
+        method, target, version = parts
+        headers = {}
+        for line in lines[1:]:
+          if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+
+        # a request body is never used, but it has to be consumed so it is not read as the next request
+        if "transfer-encoding" in headers:
+          await self._write(writer, 501, b"", None, False, False)
+          break
+        try:
+          length = int(headers.get("content-length", "0"))
+        except ValueError:
+          length = -1
+        if length < 0:
+          await self._write(writer, 400, b"", None, False, False)
+          break
+        if length > MAX_BODY_BYTES:
+          await self._write(writer, 413, b"", None, False, False)
+          break
+        if length:
+          try:
+            await reader.readexactly(length)
+          except asyncio.IncompleteReadError:
+            break
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        self.requests += 1
+        status, body, etag = self.respond(method, target, headers)
+        await self._write(writer, status, body, etag, keep_alive, method == "HEAD")
+        if not keep_alive:
+          break
+    except ConnectionError:
+      pass
+    finally:
+      writer.close()
+
+  async def _write(self, writer: asyncio.StreamWriter, status: int, body: bytes, etag: Optional[str], keep_alive: bool, head_only: bool) -> None:
+    header = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Length: {len(body)}"]
+    if status == 200:
+      header.append("Content-Type: application/json")
+    if etag:
+      header.append(f"ETag: {etag}")
+      header.append("Cache-Control: no-cache")
+    if status == 405:
+      header.append("Allow: GET, HEAD")
+    header.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    writer.write(("\r\n".join(header) + "\r\n\r\n").encode("latin-1"))
+    if not head_only:
+      writer.write(body)
+    await writer.drain()
+
+async def _serve(filename: str, host: str, port: int, reload_interval: float) -> None:
+  app = AnimalServer(filename, reload_interval)
+  await app.load()
+  server = await asyncio.start_server(app.handle, host, port, limit=MAX_HEADER_BYTES)
+  print(f"serving on http://{host}:{port}")
+  async with server:
+    await asyncio.gather(server.serve_forever(), app.watch())
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Serve animal scores, levels and furs as JSON.")
+  parser.add_argument("--file", default="global_animal_types.blo", help="RTPC file to serve")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8000)
+  parser.add_argument("--reload-interval", type=float, default=1.0, help="seconds between checks for a changed file")
+  args = parser.parse_args()
+  try:
+    asyncio.run(_serve(args.file, args.host, args.port, args.reload_interval))
+  except KeyboardInterrupt:
+    pass